@@ -0,0 +1,191 @@
+"""
+Time of flight estimation between the emitter channel and receiver channels.
+
+Delays are the lag maximizing the cross-correlation of each receiver with the
+emitter, computed with real FFTs and refined below one sample by fitting a
+parabola on the correlation peak. Every function works on 1-D waveforms or on
+2-D (captures or segments, points) arrays, all rows being processed at once.
+
+Delays include the transducers group delay (about half the burst length), which
+is the same on every receiver and cancels out in differences between channels.
+"""
+
+import logging
+from typing import Callable, Dict, NamedTuple, Optional
+
+import numpy as np
+
+from dataclass import Capture
+
+DEFAULT_REFERENCE = "EMITTER"
+
+logger = logging.getLogger(__name__)
+
+
+class DelayEstimate(NamedTuple):
+    """Delay of a signal after the reference (s) and its normalized correlation peak."""
+
+    delay: np.ndarray
+    score: np.ndarray
+
+
+def _fft_length(points: int) -> int:
+    """
+    Return the smallest 2^a.3^b.5^c FFT length avoiding circular correlation
+    wrap-around (at least 2 * points - 1), these lengths being the fastest.
+    """
+    target = max(1, 2 * points - 1)
+    best = 1 << (target - 1).bit_length()
+    power5 = 1
+    while power5 < best:
+        power35 = power5
+        while power35 < best:
+            length = power35 << max(0, (target - 1) // power35).bit_length()
+            best = min(best, length)
+            power35 *= 3
+        power5 *= 5
+    return best
+
+
+def _as_rows(values: np.ndarray) -> np.ndarray:
+    """Return a 2-D floating point array with zero mean rows."""
+    values = np.atleast_2d(np.asarray(values))
+    if not np.issubdtype(values.dtype, np.floating):
+        values = values.astype(np.float64)
+    return values - values.mean(axis=-1, keepdims=True)
+
+
+def _lag_window(
+    points: int, x_increment: float, min_delay: float, max_delay: Optional[float]
+) -> slice:
+    """Return the slice of correlation lags (in samples) searched for the peak."""
+    low = max(0, int(np.floor(min_delay / x_increment)))
+    high = points - 1 if max_delay is None else int(np.ceil(max_delay / x_increment))
+    high = min(high, points - 1)
+    if high < low:
+        raise ValueError(f"Empty delay window [{min_delay}, {max_delay}] s.")
+    return slice(low, high + 1)
+
+
+def _parabolic_offset(peaks: np.ndarray, index: np.ndarray) -> np.ndarray:
+    """Return the sub-sample offset of each row maximum, from its two neighbours."""
+    rows = np.arange(peaks.shape[0])
+    inner = (index > 0) & (index < peaks.shape[1] - 1)
+    left = peaks[rows, np.clip(index - 1, 0, None)]
+    center = peaks[rows, index]
+    right = peaks[rows, np.clip(index + 1, None, peaks.shape[1] - 1)]
+
+    curvature = left - 2 * center + right
+    valid = inner & (curvature < 0)
+    offset = np.zeros(len(index))
+    offset[valid] = 0.5 * (left - right)[valid] / curvature[valid]
+    return offset
+
+
+def _estimate(
+    reference_spectrum: np.ndarray,
+    reference_energy: np.ndarray,
+    signals: np.ndarray,
+    nfft: int,
+    lags: slice,
+    x_increment: float,
+) -> DelayEstimate:
+    """Estimate delays of zero mean signals from a precomputed reference spectrum."""
+    spectrum = np.fft.rfft(signals, nfft, axis=-1)
+    correlation = np.fft.irfft(np.conj(reference_spectrum) * spectrum, nfft, axis=-1)
+    window = correlation[:, lags]
+
+    index = window.argmax(axis=-1)
+    offset = _parabolic_offset(window, index)
+    delay = (lags.start + index + offset) * x_increment
+
+    energy = np.sqrt(reference_energy * np.einsum("ij,ij->i", signals, signals))
+    peak = window[np.arange(len(index)), index]
+    score = np.divide(peak, energy, out=np.zeros(len(index)), where=energy > 0)
+    return DelayEstimate(delay, score)
+
+
+def estimate_delays(
+    reference: np.ndarray,
+    signals: np.ndarray,
+    x_increment: float,
+    min_delay: float = 0.0,
+    max_delay: Optional[float] = None,
+) -> DelayEstimate:
+    """
+    Estimate how long each signal row lags the reference (or matching reference row).
+    Only delays in [min_delay, max_delay] seconds are searched.
+    """
+    reference, signals = _as_rows(reference), _as_rows(signals)
+    points = reference.shape[-1]
+    if signals.shape[-1] != points:
+        raise ValueError("Reference and signals must have the same number of points.")
+
+    nfft = _fft_length(points)
+    return _estimate(
+        np.fft.rfft(reference, nfft, axis=-1),
+        np.einsum("ij,ij->i", reference, reference),
+        signals,
+        nfft,
+        _lag_window(points, x_increment, min_delay, max_delay),
+        x_increment,
+    )
+
+
+def channel_delays(
+    waveforms: Dict[str, np.ndarray],
+    x_increment: float,
+    reference: str = DEFAULT_REFERENCE,
+    min_delay: float = 0.0,
+    max_delay: Optional[float] = None,
+) -> Dict[str, DelayEstimate]:
+    """
+    Estimate delay of every channel after the reference channel.
+    The reference spectrum is computed once and shared by all channels.
+    """
+    if reference not in waveforms:
+        raise KeyError(f"Reference channel '{reference}' not found.")
+
+    ref = _as_rows(waveforms[reference])
+    points = ref.shape[-1]
+    nfft = _fft_length(points)
+    ref_spectrum = np.fft.rfft(ref, nfft, axis=-1)
+    ref_energy = np.einsum("ij,ij->i", ref, ref)
+    lags = _lag_window(points, x_increment, min_delay, max_delay)
+
+    return {
+        name: _estimate(
+            ref_spectrum, ref_energy, _as_rows(values), nfft, lags, x_increment
+        )
+        for name, values in waveforms.items()
+        if name != reference and np.size(values)
+    }
+
+
+def delay_handler(
+    reference: str = DEFAULT_REFERENCE,
+    min_delay: float = 0.0,
+    max_delay: Optional[float] = None,
+) -> Callable[[str, Capture], None]:
+    """
+    Return a campaign capture handler logging mean delay of each channel.
+    Sample interval is read from the reference channel preamble of each capture.
+    """
+
+    def handler(name: str, capture: Capture) -> None:
+        x_increment = capture.waveform(reference).x_increment
+        if x_increment is None:
+            logger.error('"%s": no preamble, delays not estimated', name)
+            return
+        delays = channel_delays(capture, x_increment, reference, min_delay, max_delay)
+        for channel, estimate in delays.items():
+            logger.info(
+                '"%s" %s delay: %.3f us (score %.2f, %d rows)',
+                name,
+                channel,
+                estimate.delay.mean() * 1e6,
+                estimate.score.mean(),
+                len(estimate.delay),
+            )
+
+    return handler
@@ -0,0 +1,365 @@
+"""
+Append-only capture archive.
+
+A campaign is stored in a single data file (`.wfa`) of capture records, each one
+laid out as a capture file (see `capture_file.py`) and aligned on DATA_ALIGNMENT.
+An index file (`.wfa.idx`) holds one fixed-size entry per capture: id, trigger
+timestamp, configuration hash, tags, record offset and length. The configuration
+itself is only stored in the first record using it.
+
+Appends are crash safe: a record is written and synced before its index entry.
+On open, a partially written index entry and data past the last indexed record
+(an interrupted append) are dropped.
+
+The index is loaded in memory to select captures by time, tags or configuration.
+Records are read through a memory map of the data file: raw codes are NumPy views
+of the map, so reading a selection costs only the selected captures.
+
+Usage:
+    python archive.py measurements/campaign.wfa [--tag "Test with wind"]
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import mmap
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+
+import capture_file
+from dataclass import Capture, KeysightConfig, Preamble
+
+EXTENSION = ".wfa"
+INDEX_SUFFIX = ".idx"
+DATA_MAGIC = b"GIROWFA\x01"
+INDEX_MAGIC = b"GIROWFI\x01"
+DATA_HEADER_SIZE = capture_file.DATA_ALIGNMENT  # Magic, zero padded
+TAG_BYTES = 60
+TAG_SEPARATOR = "|"
+TAG_HASH_CHARS = 8  # Longer tags are shortened to a prefix and a hash of them
+
+INDEX_DTYPE = np.dtype(
+    [
+        ("id", "<u8"),
+        ("timestamp", "<f8"),  # Host time of the trigger, s since epoch
+        ("offset", "<u8"),  # Record start in data file
+        ("length", "<u8"),  # Record length, alignment padding included
+        ("config_hash", "S40"),  # `KeysightConfig.digest`, empty if none
+        ("tags", f"S{TAG_BYTES}"),  # "|tag1|tag2|"
+    ]
+)
+
+logger = logging.getLogger(__name__)
+
+Time = Union[float, datetime]
+
+
+def check_tag(tag: str) -> None:
+    """Raise ValueError if a tag can't be stored in an index."""
+    if not tag or TAG_SEPARATOR in tag:
+        raise ValueError(
+            f"Tags must be non-empty and can't contain '{TAG_SEPARATOR}': {tag!r}"
+        )
+
+
+def _index_tag(tag: str) -> str:
+    """
+    Return a tag as stored in index entries. Tags too long for an entry are
+    shortened to a prefix and a hash of the whole tag, selecting them still works.
+    """
+    check_tag(tag)
+    encoded = tag.encode("utf-8")
+    limit = TAG_BYTES - 2 * len(TAG_SEPARATOR)
+    if len(encoded) <= limit:
+        return tag
+    digest = hashlib.sha1(encoded).hexdigest()[:TAG_HASH_CHARS]
+    prefix = encoded[: limit - TAG_HASH_CHARS - 1].decode("utf-8", errors="ignore")
+    return f"{prefix}~{digest}"
+
+
+def _encode_tags(tags: Iterable[str]) -> bytes:
+    tags = [_index_tag(tag) for tag in tags]
+    if not tags:
+        return b""
+    encoded = (TAG_SEPARATOR + TAG_SEPARATOR.join(tags) + TAG_SEPARATOR).encode("utf-8")
+    if len(encoded) > TAG_BYTES:
+        raise ValueError(f"Tags take more than {TAG_BYTES} bytes: {tags}")
+    return encoded
+
+
+def _decode_tags(tags: bytes) -> List[str]:
+    return [tag for tag in tags.decode("utf-8").split(TAG_SEPARATOR) if tag]
+
+
+def _epoch(value: Time) -> float:
+    return value.timestamp() if isinstance(value, datetime) else float(value)
+
+
+def _aligned(offset: int) -> int:
+    return offset + -offset % capture_file.DATA_ALIGNMENT
+
+
+class CaptureArchive:
+    """
+    Archive of captures in `path` (data file) and `path + INDEX_SUFFIX`.
+    Created if missing, unless opened read-only. Appends may come from several threads.
+    `durable` syncs files to disk on every append.
+    """
+
+    def __init__(self, path: str, readonly: bool = False, durable: bool = True):
+        self.path = path
+        self.index_path = path + INDEX_SUFFIX
+        self.readonly = readonly
+        self.durable = durable
+        self._lock = threading.Lock()
+        self._map = None
+
+        if not readonly and not os.path.exists(path):
+            folder = os.path.dirname(path)
+            if folder:
+                os.makedirs(folder, exist_ok=True)
+            with open(path, "wb") as f:
+                f.write(DATA_MAGIC.ljust(DATA_HEADER_SIZE, b"\0"))
+            with open(self.index_path, "wb") as f:
+                f.write(INDEX_MAGIC)
+
+        mode = "rb" if readonly else "r+b"
+        self._data = open(path, mode)  # pylint: disable = consider-using-with
+        self._index_file = open(self.index_path, mode)  # pylint: disable = consider-using-with
+        if self._data.read(len(DATA_MAGIC)) != DATA_MAGIC:
+            raise ValueError(f"'{path}' is not a capture archive.")
+        if self._index_file.read(len(INDEX_MAGIC)) != INDEX_MAGIC:
+            raise ValueError(f"'{self.index_path}' is not a capture archive index.")
+
+        self._entries = np.empty(0, dtype=INDEX_DTYPE)  # Grown by doubling
+        self._count = 0
+        self._config_hashes = set()  # Configurations already stored
+        self._data_end = DATA_HEADER_SIZE
+        self._load_index()
+
+    def _load_index(self):
+        """Load index entries, dropping those left incomplete by an interrupted append."""
+        index_size = os.fstat(self._index_file.fileno()).st_size - len(INDEX_MAGIC)
+        complete = index_size // INDEX_DTYPE.itemsize
+        self._index_file.seek(len(INDEX_MAGIC))
+        entries = np.fromfile(self._index_file, dtype=INDEX_DTYPE, count=complete)
+
+        # Entries are kept up to the first record missing from data
+        data_size = os.fstat(self._data.fileno()).st_size
+        fits = entries["offset"] + entries["length"] <= data_size
+        entries = entries[: len(entries) if fits.all() else int(np.argmin(fits))]
+        if len(entries) != complete or index_size % INDEX_DTYPE.itemsize:
+            logger.warning(
+                "'%s': %d index entries kept, incomplete ones dropped",
+                self.index_path,
+                len(entries),
+            )
+
+        self._entries = entries.copy()
+        self._count = len(entries)
+        self._config_hashes = set(entries["config_hash"].tolist())
+        if len(entries):
+            self._data_end = int(entries["offset"][-1] + entries["length"][-1])
+        if self.readonly:
+            return
+
+        # Index entry or record of an interrupted append
+        self._index_file.truncate(len(INDEX_MAGIC) + self._count * INDEX_DTYPE.itemsize)
+        if data_size > self._data_end:
+            logger.warning(
+                "'%s': %d bytes of unindexed data dropped",
+                self.path,
+                data_size - self._data_end,
+            )
+            self._data.truncate(self._data_end)
+
+    @property
+    def index(self) -> np.ndarray:
+        """Index entries of every capture (structured array, see INDEX_DTYPE)."""
+        return self._entries[: self._count]
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _sync(self, f):
+        f.flush()
+        if self.durable:
+            os.fsync(f.fileno())
+
+    def append(
+        self,
+        channels: Dict[str, Tuple[np.ndarray, Preamble]],
+        timestamp: float = None,
+        config: KeysightConfig = None,
+        segment_times: np.ndarray = None,
+        tags: Iterable[str] = (),
+    ) -> int:
+        """
+        Append raw codes of each channel (name -> (codes, preamble)) as a new capture,
+        see `capture_file.write_capture`. Return its id.
+        """
+        if self.readonly:
+            raise ValueError(f"'{self.path}' is opened read-only.")
+        timestamp = time.time() if timestamp is None else timestamp
+        config_hash = config.digest().encode() if config is not None else b""
+        entry = np.zeros(1, dtype=INDEX_DTYPE)
+        entry["timestamp"] = timestamp
+        entry["config_hash"] = config_hash
+        entry["tags"] = _encode_tags(tags)
+
+        with self._lock:
+            known = config_hash in self._config_hashes
+            blocks = capture_file.encode_capture(
+                channels, segment_times, None if known else config, timestamp
+            )
+            offset = self._data_end
+            self._data.seek(offset)
+            for block in blocks:
+                self._data.write(block)
+            end = self._data.tell()
+            self._data.write(b"\0" * (_aligned(end) - end))
+            self._sync(self._data)
+
+            # Record is on disk before being indexed
+            entry["id"] = self._count
+            entry["offset"] = offset
+            entry["length"] = _aligned(end) - offset
+            self._index_file.seek(len(INDEX_MAGIC) + self._count * INDEX_DTYPE.itemsize)
+            self._index_file.write(entry.tobytes())
+            self._sync(self._index_file)
+
+            if self._count == len(self._entries):
+                grown = np.empty(max(16, 2 * self._count), dtype=INDEX_DTYPE)
+                grown[: self._count] = self.index
+                self._entries = grown
+            self._entries[self._count] = entry[0]
+            self._count += 1
+            self._config_hashes.add(config_hash)
+            self._data_end = _aligned(end)
+            return self._count - 1
+
+    def select(
+        self,
+        start: Time = None,
+        stop: Time = None,
+        tags: Iterable[str] = (),
+        config_hash: str = None,
+    ) -> np.ndarray:
+        """
+        Return index entries of captures triggered in [start, stop) (s since epoch or
+        datetime), holding every tag of `tags` and acquired with a configuration digest.
+        """
+        entries = self.index
+        mask = np.ones(len(entries), dtype=bool)
+        if start is not None:
+            mask &= entries["timestamp"] >= _epoch(start)
+        if stop is not None:
+            mask &= entries["timestamp"] < _epoch(stop)
+        for tag in tags:
+            pattern = _encode_tags([tag])
+            mask &= np.char.find(entries["tags"], pattern) >= 0
+        if config_hash is not None:
+            mask &= entries["config_hash"] == config_hash.encode()
+        return entries[mask]
+
+    def _buffer(self, end: int) -> mmap.mmap:
+        """Return a memory map of the data file covering `end` bytes."""
+        if self._map is None or len(self._map) < end:
+            self._data.flush()
+            # Previous map stays valid while arrays still view it
+            self._map = mmap.mmap(self._data.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._map
+
+    def _entry(self, entry: Union[int, np.void]) -> np.void:
+        if isinstance(entry, (int, np.integer)):
+            if not 0 <= entry < self._count:
+                raise KeyError(f"No capture {entry} in '{self.path}'.")
+            return self.index[entry]
+        return entry
+
+    def read_codes(self, entry: Union[int, np.void]) -> Tuple[Dict, np.ndarray]:
+        """
+        Return header and a read-only (channels, segments, points) view of the raw codes
+        of a capture, given by id or index entry. Nothing is copied.
+        """
+        entry = self._entry(entry)
+        offset = int(entry["offset"])
+        buffer = self._buffer(offset + int(entry["length"]))
+        header, data_offset = capture_file.parse_header(buffer, offset)
+        shape = (len(header["channels"]), header["segments"], header["points"])
+        codes = np.frombuffer(
+            buffer,
+            dtype=np.dtype(header["dtype"]),
+            count=int(np.prod(shape)),
+            offset=offset + data_offset,
+        )
+        return header, codes.reshape(shape)
+
+    def read(self, entry: Union[int, np.void], channels: List[str] = None) -> Capture:
+        """Return a capture in volts, for every channel or only `channels`."""
+        header, codes = self.read_codes(entry)
+        return capture_file.to_capture(header, codes, channels)
+
+    def captures(
+        self, entries: np.ndarray = None, channels: List[str] = None
+    ) -> Iterator[Capture]:
+        """Yield captures of selected entries (see `select`), every capture by default."""
+        for entry in self.index if entries is None else entries:
+            yield self.read(entry, channels)
+
+    def config(self, config_hash: str) -> Optional[Dict]:
+        """Return configuration metadata saved with a configuration digest, if any."""
+        entries = self.select(config_hash=config_hash)
+        if not len(entries):
+            return None
+        header, _ = self.read_codes(entries[0])
+        return header["config"]
+
+    def close(self):
+        self._map = None
+        self._data.close()
+        self._index_file.close()
+
+    def __enter__(self) -> "CaptureArchive":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description="List captures of an archive.")
+    parser.add_argument("archive")
+    parser.add_argument("--tag", action="append", default=[], help="Keep tagged captures")
+    parser.add_argument("--start", type=datetime.fromisoformat, help="ISO date and time")
+    parser.add_argument("--stop", type=datetime.fromisoformat, help="ISO date and time")
+    args = parser.parse_args(argv)
+
+    with CaptureArchive(args.archive, readonly=True) as archive:
+        entries = archive.select(args.start, args.stop, args.tag)
+        for entry in entries:
+            header, _ = archive.read_codes(entry)
+            print(
+                json.dumps(
+                    {
+                        "id": int(entry["id"]),
+                        "time": datetime.fromtimestamp(entry["timestamp"]).isoformat(),
+                        "tags": _decode_tags(entry["tags"]),
+                        "channels": [ch["name"] for ch in header["channels"]],
+                        "segments": header["segments"],
+                        "points": header["points"],
+                        "config": entry["config_hash"].decode(),
+                    }
+                )
+            )
+        print(f"{len(entries)} of {len(archive)} captures")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+"""
+asyncio front end of `KeysightDevice`.
+
+Every VISA call of a device runs on its own single worker thread, so calls keep
+their order and the event loop is never blocked: a scope, a serial link to the
+test board and a live view can run in one process, scheduled with `asyncio.gather`.
+Waiting for a trigger is split in short `KeysightDevice.poll_trigger` steps
+(service request slices, or status polls with back-off), the event loop running
+in between: waits are cancellable,
+cancelling one stops the acquisition.
+"""
+
+import asyncio
+import functools
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Callable, Dict, Optional, Union
+
+import pyvisa
+
+from dataclass import Capture, KeysightConfig, TriggerWait
+from instrumentation import Profiler
+from keysight import (
+    DEFAULT_STATE_FILE,
+    POLL_BACKOFF,
+    POLL_MAX_INTERVAL,
+    POLL_MIN_INTERVAL,
+    KeysightDevice,
+)
+
+ASYNC_SRQ_SLICE = 100  # ms, worker thread is busy for at most this long per step
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncKeysightDevice:
+    """
+    Awaitable `KeysightDevice`, built from a configuration (or wrapping an existing
+    device). Use it as an async context manager to release it on exit.
+    """
+
+    def __init__(
+        self,
+        config: KeysightConfig = None,
+        state_file: Optional[str] = DEFAULT_STATE_FILE,
+        profiler: Profiler = None,
+        device: KeysightDevice = None,
+    ):
+        if device is None:
+            if config is None:
+                raise ValueError("A configuration or a device is required.")
+            device = KeysightDevice(config, state_file, profiler)
+        self.device = device
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="visa")
+
+    @property
+    def config(self) -> KeysightConfig:
+        return self.device.config
+
+    async def run(self, func: Callable, *args, **kwargs):
+        """Run a blocking call on the device worker thread."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor, functools.partial(func, *args, **kwargs)
+        )
+
+    async def connect(
+        self,
+        address: str = None,
+        force_reset: bool = False,
+        resource_manager: pyvisa.ResourceManager = None,
+    ):
+        await self.run(self.device.connect, address, force_reset, resource_manager)
+
+    async def setup(self):
+        await self.run(self.device.setup)
+
+    async def arm(self) -> Union[TriggerWait, None]:
+        """Arm a single acquisition, return the wait strategy or None on failure."""
+        return await self.run(self.device.arm)
+
+    async def _wait_srq(self, deadline: Optional[float]) -> bool:
+        try:
+            while deadline is None or time.monotonic() < deadline:
+                slice_ms = ASYNC_SRQ_SLICE
+                if deadline is not None:
+                    remaining_ms = int((deadline - time.monotonic()) * 1000)
+                    slice_ms = max(1, min(slice_ms, remaining_ms))
+                if await self.run(self.device.poll_trigger, TriggerWait.SRQ, slice_ms):
+                    return True
+            return False
+        finally:
+            await self.run(self.device.end_wait, TriggerWait.SRQ)
+
+    async def _wait_poll(self, deadline: Optional[float]) -> bool:
+        interval = POLL_MIN_INTERVAL
+        while not await self.run(self.device.poll_trigger, TriggerWait.POLL):
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            await asyncio.sleep(interval)
+            interval = min(interval * POLL_BACKOFF, POLL_MAX_INTERVAL)
+        return True
+
+    async def wait_trigger(self, strategy: TriggerWait) -> bool:
+        """
+        Wait for an armed acquisition to complete, within configured timeout.
+        Return True once data is ready to be read.
+        """
+        timeout = self.config.trigger_timeout
+        deadline = None if timeout is None else time.monotonic() + timeout
+        start = time.perf_counter()
+        try:
+            if strategy == TriggerWait.SRQ:
+                done = await self._wait_srq(deadline)
+            else:
+                done = await self._wait_poll(deadline)
+        except asyncio.CancelledError:
+            await self.run(self.device.stop)
+            logger.warning("Trigger wait cancelled, acquisition stopped")
+            raise
+        except Exception as e:
+            logger.error("Acquisition error: %s", e)
+            return False
+        finally:
+            self.device.profiler.stage("wait", start)
+
+        if not done:
+            await self.run(self.device.stop)
+            logger.error("No trigger within %s s", timeout)
+            return False
+        self.device.trigger_time = time.time()
+        logger.info("Trigger detected")
+        return True
+
+    async def acquire(self) -> bool:
+        """Arm the device and wait for the acquisition to complete."""
+        strategy = await self.arm()
+        return strategy is not None and await self.wait_trigger(strategy)
+
+    async def fetch(self) -> Capture:
+        """Transfer and parse the last acquisition (see `KeysightDevice.fetch`)."""
+        return await self.run(self.device.fetch)
+
+    async def collect(self) -> Capture:
+        """Acquire and fetch a capture, empty if acquisition failed."""
+        self.device.clear_capture()
+        if not await self.acquire():
+            logger.error("Acquisition failed, no data retrieved")
+            return self.device.capture
+        return await self.fetch()
+
+    async def measure(self) -> Dict[str, float]:
+        """Acquire a single shot and return configured measurements (see `KeysightDevice.measure`)."""
+        if not self.config.measurements:
+            logger.error("No measurement configured")
+            return {}
+        if not await self.acquire():
+            logger.error("Acquisition failed, no measurement retrieved")
+            return {}
+        return await self.run(self.device.read_measurements)
+
+    async def stream(self, count: int = None) -> AsyncIterator[Capture]:
+        """Yield `count` captures (endlessly if None), failed acquisitions skipped."""
+        done = 0
+        while count is None or done < count:
+            waveforms = await self.collect()
+            if any(values.size for values in waveforms.values()):
+                done += 1
+                yield waveforms
+
+    async def release(self):
+        """Release the device connection and its worker thread."""
+        try:
+            await self.run(self.device.release)
+        finally:
+            self._executor.shutdown(wait=False)
+
+    async def __aenter__(self) -> "AsyncKeysightDevice":
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.release()
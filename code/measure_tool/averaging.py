@@ -0,0 +1,165 @@
+"""
+Host-side coherent averaging of repeated captures.
+
+Captures are accumulated one at a time into preallocated arrays (running mean and
+sum of squared deviations, Welford algorithm), so memory does not grow with the
+number of captures. Every segment of a segmented capture counts as one shot.
+Captures are aligned on their trigger using the preamble x origin: a capture
+shifted by k samples only updates the samples overlapping the first one.
+
+The SNR of each channel estimates when averaging is good enough:
+signal power is the power of the running mean, noise power is the per-sample
+variance divided by the number of shots averaged.
+"""
+
+import math
+import threading
+from typing import Dict, Optional
+
+import numpy as np
+
+from dataclass import Capture, Preamble
+
+
+class _Accumulator:
+    """Running mean and squared deviations of one channel, updated in place."""
+
+    def __init__(self, points: int):
+        self.count = np.zeros(points, dtype=np.int64)
+        self.mean = np.zeros(points)
+        self.m2 = np.zeros(points)
+        self._delta = np.empty(points)  # Scratch buffers, no allocation per shot
+        self._delta2 = np.empty(points)
+
+    def add(self, values: np.ndarray, shift: int):
+        """Add a shot whose sample i matches accumulator sample i + shift."""
+        points = len(self.mean)
+        start, stop = max(0, shift), min(points, len(values) + shift)
+        if stop <= start:
+            return
+        target = slice(start, stop)
+        source = values[start - shift : stop - shift]
+        size = stop - start
+
+        count = self.count[target]
+        mean = self.mean[target]
+        delta = self._delta[:size]
+        delta2 = self._delta2[:size]
+
+        count += 1
+        np.subtract(source, mean, out=delta)
+        np.divide(delta, count, out=delta2)
+        mean += delta2
+        np.subtract(source, mean, out=delta2)
+        delta *= delta2
+        self.m2[target] += delta
+
+    def variance(self) -> np.ndarray:
+        """Per-sample variance of shots (NaN where fewer than two shots)."""
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(self.count > 1, self.m2 / (self.count - 1), np.nan)
+
+    def snr_db(self) -> float:
+        valid = self.count > 1
+        if not valid.any():
+            return math.nan
+        noise = np.mean(self.variance()[valid] / self.count[valid])
+        signal = np.var(self.mean[valid]) - noise  # Residual noise removed
+        if noise <= 0 or signal <= 0:
+            return math.inf if noise <= 0 < signal else math.nan
+        return 10 * math.log10(signal / noise)
+
+
+class CoherentAverager:
+    """
+    Average repeated captures of the same channels, aligned on their trigger.
+    Accumulators are allocated on the first capture (or up front if `points` is set).
+    """
+
+    def __init__(self, points: Optional[int] = None, channels=None):
+        self.points = points
+        self.shots = 0
+        self._accumulators: Dict[str, _Accumulator] = {}
+        self._x_origin = None
+        self._x_increment = None
+        self._lock = threading.Lock()
+        if points is not None:
+            for name in channels or []:
+                self._accumulators[name] = _Accumulator(points)
+
+    def _shift(self, preamble: Optional[Preamble]) -> int:
+        """Return sample offset of a capture from the first one, using trigger origin."""
+        if preamble is None:
+            return 0
+        if self._x_origin is None:
+            self._x_origin = preamble.x_origin
+            self._x_increment = preamble.x_increment
+            return 0
+        if not math.isclose(preamble.x_increment, self._x_increment, rel_tol=1e-6):
+            raise ValueError("Captures with different sample intervals can't be averaged.")
+        return round((preamble.x_origin - self._x_origin) / self._x_increment)
+
+    def add(
+        self,
+        waveforms: Dict[str, np.ndarray],
+        preambles: Optional[Dict[str, Preamble]] = None,
+    ) -> int:
+        """
+        Accumulate a capture (1-D waveforms, or one row per segment).
+        Preambles of a `Capture` are used unless given.
+        Return the number of shots averaged so far.
+        """
+        if preambles is None and isinstance(waveforms, Capture):
+            preambles = waveforms.preambles
+        preambles = preambles or {}
+        with self._lock:
+            shots = 0
+            for name, values in waveforms.items():
+                rows = np.atleast_2d(values)
+                if not rows.size:
+                    continue
+                accumulator = self._accumulators.get(name)
+                if accumulator is None:
+                    points = self.points or rows.shape[-1]
+                    accumulator = self._accumulators[name] = _Accumulator(points)
+                shift = self._shift(preambles.get(name))
+                for row in rows:
+                    accumulator.add(row, shift)
+                shots = max(shots, len(rows))
+            self.shots += shots
+            return self.shots
+
+    def handler(self, _name: str, waveforms: Dict[str, np.ndarray]) -> None:
+        """Campaign capture handler (see `campaign.CaptureHandler`)."""
+        self.add(waveforms)
+
+    @property
+    def mean(self) -> Dict[str, np.ndarray]:
+        """Averaged waveform of each channel."""
+        return {name: acc.mean.copy() for name, acc in self._accumulators.items()}
+
+    @property
+    def std(self) -> Dict[str, np.ndarray]:
+        """Per-sample standard deviation of shots, for each channel."""
+        return {name: np.sqrt(acc.variance()) for name, acc in self._accumulators.items()}
+
+    def snr(self) -> Dict[str, float]:
+        """SNR of each averaged channel, in dB."""
+        with self._lock:
+            return {name: acc.snr_db() for name, acc in self._accumulators.items()}
+
+    def converged(self, target_db: float) -> bool:
+        """True once every channel reaches the target SNR."""
+        values = self.snr()
+        return bool(values) and all(v >= target_db for v in values.values())
+
+    def reset(self):
+        """Drop accumulated shots, keeping allocated accumulators."""
+        with self._lock:
+            for acc in self._accumulators.values():
+                acc.count[:] = 0
+                acc.mean[:] = 0
+                acc.m2[:] = 0
+            self.shots = 0
+            self._x_origin = None
+            self._x_increment = None
@@ -0,0 +1,274 @@
+"""
+Offline batch processing of capture folders.
+
+Scans a folder for CSV and binary capture files, and runs the analysis pipeline
+on each of them in a process pool, by blocks of segments so memory stays bounded: emitter to receivers delays (see `analysis.py`),
+amplitude and noise of every channel. One row per file is written to a results
+index (CSV), keyed by path and modification time: files already in the index are
+skipped, so re-runs only process new or modified captures.
+
+Usage:
+    python batch.py measurements [--output results.csv] [--workers 8] [--force]
+"""
+
+import argparse
+import csv
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, Iterator, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+import analysis
+import capture_file
+from csv_export import CSV_CHUNK_ROWS
+from dataclass import FileFormat
+
+DEFAULT_INDEX = "results.csv"
+INDEX_KEYS = ["path", "mtime_ns", "status"]
+SAVE_EVERY = 50  # Completed files between index saves
+SEGMENT_GAP = 1.5  # Timestamp steps above this many sample intervals split segments
+BLOCK_POINTS = CSV_CHUNK_ROWS  # Points per channel analysed at once (whole segments)
+
+logger = logging.getLogger(__name__)
+
+
+def _segments(rows: pd.DataFrame, points: int) -> Dict[str, np.ndarray]:
+    """Return (segments, points) arrays of each channel of CSV rows."""
+    return {
+        name: rows[name].to_numpy().reshape(-1, points)
+        for name in rows.columns
+        if name != "Timestamp"
+    }
+
+
+def _csv_blocks(file_path: str) -> Iterator[Tuple[Dict[str, np.ndarray], float]]:
+    """
+    Read a CSV capture by chunks, yield blocks of whole (segments, points) arrays
+    per channel and sample interval. Segments are split on timestamp gaps: only
+    the rows of the current segment are kept between chunks.
+    """
+    pending = None  # Rows not yielded yet
+    x_increment = points = None
+    for chunk in pd.read_csv(file_path, dtype=np.float64, chunksize=CSV_CHUNK_ROWS):
+        if "Timestamp" not in chunk.columns:
+            raise ValueError("No Timestamp column")
+        if pending is not None:
+            chunk = pd.concat([pending, chunk], ignore_index=True)
+        pending = chunk
+        steps = np.diff(pending["Timestamp"].to_numpy())
+        if x_increment is None:
+            if not len(steps):
+                continue
+            x_increment = float(np.median(steps))
+        if points is None:
+            starts = np.flatnonzero(np.abs(steps) > SEGMENT_GAP * x_increment) + 1
+            if not len(starts):
+                continue
+            points = int(starts[0])
+        rows = len(pending) // points * points
+        if rows:
+            yield _segments(pending.iloc[:rows], points), x_increment
+            pending = pending.iloc[rows:]
+
+    if x_increment is None:
+        raise ValueError("Not enough samples")
+    if points is None:  # Single segment
+        points = len(pending)
+    rows = len(pending) // points * points
+    if rows:
+        yield _segments(pending.iloc[:rows], points), x_increment
+
+
+def _capture_blocks(file_path: str) -> Iterator[Tuple[Dict[str, np.ndarray], float]]:
+    """
+    Map a binary capture, yield blocks of (segments, points) volts per channel and
+    sample interval. Only one block of segments is converted at a time.
+    """
+    header, codes = capture_file.read_capture(file_path)
+    x_increment = header["channels"][0]["preamble"]["x_increment"]
+    step = max(1, BLOCK_POINTS // max(1, header["points"]))
+    for start in range(0, header["segments"], step):
+        yield {
+            channel["name"]: capture_file.to_volts(
+                codes[i, start : start + step], channel["preamble"]
+            )
+            for i, channel in enumerate(header["channels"])
+        }, x_increment
+
+
+def process_file(file_path: str, reference: str = analysis.DEFAULT_REFERENCE) -> Dict:
+    """
+    Analyse a single capture file by blocks of segments, return its results row
+    (without index keys).
+    """
+    if file_path.endswith(FileFormat.BINARY.value):
+        blocks = _capture_blocks(file_path)
+    else:
+        blocks = _csv_blocks(file_path)
+
+    segments = points = 0
+    x_increment = None
+    vpp, squares, delays = {}, {}, {}
+    for channels, x_increment in blocks:
+        first = next(iter(channels.values()))
+        segments += first.shape[0]
+        points = first.shape[1]
+        for name, values in channels.items():
+            spans = values.max(axis=1) - values.min(axis=1)
+            vpp[name] = vpp.get(name, 0.0) + float(np.sum(spans))
+            squares[name] = squares.get(name, 0.0) + float(np.sum(np.square(values)))
+        if reference in channels:
+            for name, estimate in analysis.channel_delays(
+                channels, x_increment, reference
+            ).items():
+                delays.setdefault(name, []).append(estimate)
+    if not segments:
+        raise ValueError("Not enough samples")
+
+    row = {"segments": segments, "points": points, "x_increment": x_increment}
+    for name in vpp:
+        row[f"{name}_vpp"] = vpp[name] / segments
+        row[f"{name}_rms"] = float(np.sqrt(squares[name] / (segments * points)))
+
+    for name, estimates in delays.items():
+        delay = np.concatenate([np.atleast_1d(e.delay) for e in estimates])
+        score = np.concatenate([np.atleast_1d(e.score) for e in estimates])
+        row[f"{name}_delay_us"] = float(np.mean(delay) * 1e6)
+        row[f"{name}_delay_std_ns"] = float(np.std(delay) * 1e9)
+        row[f"{name}_score"] = float(np.mean(score))
+    return row
+
+
+def is_capture(file_path: str) -> bool:
+    """
+    Return whether a file is a capture: binary file starting with the format magic,
+    or CSV file whose first column is Timestamp.
+    """
+    try:
+        if file_path.endswith(FileFormat.BINARY.value):
+            with open(file_path, "rb") as f:
+                return f.read(len(capture_file.MAGIC)) == capture_file.MAGIC
+        with open(file_path, "r", encoding="utf-8") as f:
+            return f.readline().split(",")[0].strip() == "Timestamp"
+    except (OSError, UnicodeDecodeError):
+        return False
+
+
+def _process(file_path: str, mtime_ns: int, reference: str) -> Dict:
+    """Worker entry point, never raises: failures are reported in the row status."""
+    row = {"path": file_path, "mtime_ns": mtime_ns}
+    try:
+        row.update(process_file(file_path, reference))
+        row["status"] = "ok"
+    except Exception as e:  # pylint: disable = broad-exception-caught
+        row["status"] = f"error: {e}"
+    return row
+
+
+def scan(folder: str, index_path: str) -> List[Tuple[str, int]]:
+    """
+    Return (path, mtime_ns) of capture files in a folder, index file and files
+    without a capture header (e.g. wind logs) excluded.
+    """
+    extensions = tuple(f.value for f in FileFormat)
+    files = []
+    with os.scandir(folder) as entries:
+        for entry in entries:
+            if not entry.is_file() or not entry.name.endswith(extensions):
+                continue
+            if os.path.abspath(entry.path) == os.path.abspath(index_path):
+                continue
+            if not is_capture(entry.path):
+                logger.debug("Not a capture, skipped: %s", entry.path)
+                continue
+            files.append((entry.path, entry.stat().st_mtime_ns))
+    return sorted(files)
+
+
+def load_index(index_path: str) -> Dict[str, Dict]:
+    """Return results rows by path, from an existing index."""
+    if not os.path.exists(index_path):
+        return {}
+    with open(index_path, "r", newline="", encoding="utf-8") as f:
+        return {row["path"]: row for row in csv.DictReader(f)}
+
+
+def save_index(index_path: str, rows: Dict[str, Dict]) -> None:
+    """Write results rows, atomically replacing the index."""
+    fields = list(INDEX_KEYS)
+    for row in rows.values():
+        fields += [key for key in row if key not in fields]
+
+    temp_path = index_path + ".tmp"
+    with open(temp_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=fields)
+        writer.writeheader()
+        writer.writerows(rows[path] for path in sorted(rows))
+    os.replace(temp_path, index_path)
+
+
+def run_batch(
+    folder: str,
+    index_path: str = None,
+    workers: int = None,
+    reference: str = analysis.DEFAULT_REFERENCE,
+    force: bool = False,
+) -> Dict[str, Dict]:
+    """Process new or modified captures of a folder, return all results rows by path."""
+    index_path = index_path or os.path.join(folder, DEFAULT_INDEX)
+    rows = {} if force else load_index(index_path)
+    files = scan(folder, index_path)
+    # Rows of deleted files are dropped
+    rows = {path: rows[path] for path, _ in files if path in rows}
+    todo = [
+        (path, mtime)
+        for path, mtime in files
+        if path not in rows or rows[path]["mtime_ns"] != str(mtime)
+    ]
+    logger.info("%d capture files, %d to process", len(files), len(todo))
+    if not todo:
+        save_index(index_path, rows)
+        return rows
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(_process, path, mtime, reference) for path, mtime in todo]
+        for done, future in enumerate(as_completed(futures), start=1):
+            row = future.result()
+            rows[row["path"]] = row
+            if row["status"] != "ok":
+                logger.warning("%s: %s", row["path"], row["status"])
+
+            elapsed = time.perf_counter() - start
+            logger.info(
+                "%d/%d files processed (%.1f files/s)", done, len(todo), done / elapsed
+            )
+            if done % SAVE_EVERY == 0:
+                save_index(index_path, rows)
+
+    save_index(index_path, rows)
+    logger.info("Results saved to: %s", index_path)
+    return rows
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description="Analyse every capture of a folder.")
+    parser.add_argument("folder")
+    parser.add_argument("--output", help=f"Results index (default: folder/{DEFAULT_INDEX})")
+    parser.add_argument("--workers", type=int, default=None, help="Default: all cores")
+    parser.add_argument("--reference", default=analysis.DEFAULT_REFERENCE)
+    parser.add_argument("--force", action="store_true", help="Process every file again")
+    args = parser.parse_args(argv)
+
+    rows = run_batch(args.folder, args.output, args.workers, args.reference, args.force)
+    failed = sum(row["status"] != "ok" for row in rows.values())
+    print(f"{len(rows)} captures in index, {failed} failed")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -0,0 +1,155 @@
+# pylint: disable = missing-function-docstring
+
+"""
+Throughput benchmark of the measure tool, run against the simulated oscilloscope.
+
+Times each stage of a capture cycle (setup, acquire, transfer, parse, save, plot)
+for every size of `ALLOWED_WAVEFORM_POINTS` and each requested transfer format.
+
+Usage:
+    python benchmark.py [--formats BYTE ASCII] [--max-points 200000] [--repeat 3]
+"""
+
+import argparse
+import csv
+import logging
+import os
+import statistics
+import tempfile
+import time
+from typing import Dict, List
+
+import keysight as ks
+from dataclass import ALLOWED_WAVEFORM_POINTS, KeysightConfig, WaveformFormat
+from plotter import _load_csv_file, build_figure
+from presets import make_config
+from simulator import SimulatedResourceManager
+
+STAGES = ["setup", "acquire", "transfer", "parse", "save", "plot"]
+
+logger = logging.getLogger(__name__)
+
+
+def run_cycle(config: KeysightConfig, folder: str, plot: bool, **sim) -> Dict[str, float]:
+    """Run a single capture cycle and return duration of each stage, in seconds."""
+    timings = {}
+    device = ks.KeysightDevice(config, state_file=None)
+
+    start = time.perf_counter()
+    device.connect(resource_manager=SimulatedResourceManager(**sim))
+    device.setup()
+    timings["setup"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    if not device.acquire():
+        raise RuntimeError("Simulated acquisition failed")
+    timings["acquire"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    raw = device.transfer()
+    timings["transfer"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    capture = device.parse(raw)
+    timings["parse"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    file_name = device.save_measures(folder, "benchmark", capture)
+    timings["save"] = time.perf_counter() - start
+
+    if plot:
+        start = time.perf_counter()
+        df = _load_csv_file(os.path.join(folder, file_name))
+        build_figure([df], [file_name]).to_html(include_plotlyjs=False)
+        timings["plot"] = time.perf_counter() - start
+
+    device.release()
+    return timings
+
+
+def run_benchmark(
+    formats: List[WaveformFormat],
+    points_list: List[int],
+    repeat: int,
+    plot: bool,
+    **sim,
+) -> List[Dict]:
+    """Run every (format, points) combination and return median stage durations."""
+    results = []
+    with tempfile.TemporaryDirectory() as folder:
+        for waveform_format in formats:
+            for points in points_list:
+                config = make_config(points, waveform_format)
+                runs = [run_cycle(config, folder, plot, **sim) for _ in range(repeat)]
+
+                row = {"format": waveform_format.name, "points": points}
+                for stage in STAGES:
+                    values = [run[stage] for run in runs if stage in run]
+                    row[stage] = statistics.median(values) if values else None
+                row["total"] = sum(row[stage] or 0 for stage in STAGES)
+                results.append(row)
+                print(format_row(row), flush=True)
+    return results
+
+
+def format_header() -> str:
+    columns = ["format", "points"] + STAGES + ["total"]
+    return " ".join(f"{c:>10}" for c in columns)
+
+
+def format_row(row: Dict) -> str:
+    cells = [f"{row['format']:>10}", f"{row['points']:>10}"]
+    for stage in STAGES + ["total"]:
+        value = row[stage]
+        cells.append(f"{'-':>10}" if value is None else f"{value * 1000:>8.1f}ms")
+    return " ".join(cells)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--formats",
+        nargs="+",
+        default=[f.name for f in WaveformFormat],
+        choices=[f.name for f in WaveformFormat],
+    )
+    parser.add_argument("--min-points", type=int, default=ALLOWED_WAVEFORM_POINTS[0])
+    parser.add_argument("--max-points", type=int, default=ALLOWED_WAVEFORM_POINTS[-1])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--no-plot", action="store_true", help="Skip plot stage")
+    parser.add_argument(
+        "--link-rate",
+        type=float,
+        default=None,
+        help="Simulated link throughput in MB/s (unlimited by default)",
+    )
+    parser.add_argument("--output", help="Write results to this CSV file")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+
+    points_list = [
+        p for p in ALLOWED_WAVEFORM_POINTS if args.min_points <= p <= args.max_points
+    ]
+    sim = {"trigger_delay": 0.0, "seed": 0}
+    if args.link_rate:
+        sim["link_rate"] = args.link_rate * 1e6
+
+    print(format_header())
+    results = run_benchmark(
+        [WaveformFormat[f] for f in args.formats],
+        points_list,
+        args.repeat,
+        not args.no_plot,
+        **sim,
+    )
+
+    if args.output:
+        with open(args.output, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=list(results[0].keys()))
+            writer.writeheader()
+            writer.writerows(results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+# pylint: disable = missing-class-docstring, broad-exception-caught
+
+"""
+Pipelined measurement campaign runner.
+
+The calling thread owns the instrument and only arms, waits and transfers.
+Transferred captures are handed to writer threads through a bounded queue,
+which parse, save and analyse them while the next trigger is armed.
+When writers fall behind, the full queue blocks the instrument thread (backpressure).
+"""
+
+import logging
+import queue
+import threading
+from typing import Callable, List, Union
+
+from dataclass import Capture, FileFormat
+from archive import CaptureArchive, check_tag
+from keysight import KeysightDevice, RawCapture
+
+DEFAULT_QUEUE_SIZE = 4
+DEFAULT_WORKERS = 2
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Called by writer threads with the measure name and parsed capture
+# (a `Capture` maps channel names to waveform arrays, like a dict)
+CaptureHandler = Callable[[str, Capture], None]
+
+
+class CampaignRunner:
+    def __init__(
+        self,
+        device: KeysightDevice,
+        folder: str,
+        workers: int = DEFAULT_WORKERS,
+        queue_size: int = DEFAULT_QUEUE_SIZE,
+        handlers: List[CaptureHandler] = None,
+        file_format: FileFormat = FileFormat.CSV,
+        archive: CaptureArchive = None,
+    ):
+        if workers < 1:
+            raise ValueError("At least one writer is required.")
+        if queue_size < 1:
+            raise ValueError("Queue size must be positive.")
+
+        self.device = device
+        self.folder = folder
+        self.workers = workers
+        self.handlers = handlers or []
+        self.file_format = file_format
+        self.archive = archive  # Captures are appended to it instead of files, if set
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._results = {}
+        self._lock = threading.Lock()
+
+    def _process(self, index: int, name: str, raw: RawCapture):
+        """Parse, save and analyse a single capture."""
+        capture = None
+        if self.archive is not None:
+            saved = self.device.archive_capture(self.archive, name, raw)
+        elif self.file_format == FileFormat.BINARY:
+            saved = self.device.save_capture(self.folder, name, raw)
+        else:
+            capture = self.device.parse(raw)
+            saved = self.device.save_measures(self.folder, name, capture)
+        with self._lock:
+            self._results[index] = saved
+
+        if self.handlers and capture is None:
+            capture = self.device.parse(raw)
+        for handler in self.handlers:
+            handler(name, capture)
+
+    def _writer(self):
+        """Writer thread loop, stops on `None` sentinel."""
+        while True:
+            job = self._queue.get()
+            try:
+                if job is None:
+                    return
+                self._process(*job)
+            except Exception as e:
+                logger.error("Failed processing capture '%s': %s", job[1], e)
+            finally:
+                self._queue.task_done()
+
+    def run(self, names: List[str]) -> List[Union[str, int]]:
+        """
+        Capture one acquisition per measure name.
+        Return saved file names (capture ids when archiving), in the order of `names`
+        (failed captures are skipped).
+        """
+        if self.archive is not None:
+            # Names tag archived captures: rejected before acquiring, not in writers
+            for name in names:
+                check_tag(name)
+
+        threads = [
+            threading.Thread(target=self._writer, name=f"writer-{i}", daemon=True)
+            for i in range(self.workers)
+        ]
+        for thread in threads:
+            thread.start()
+
+        self._results = {}
+        try:
+            for index, name in enumerate(names):
+                logger.info('Running capture "%s"', name)
+                if not self.device.acquire():
+                    logger.error('Acquisition failed for "%s"', name)
+                    continue
+
+                raw = self.device.transfer()
+                if self._queue.full():
+                    logger.warning("Writers are falling behind, waiting")
+                self._queue.put((index, name, raw))
+        finally:
+            for _ in threads:
+                self._queue.put(None)
+            for thread in threads:
+                thread.join()
+
+        saved = [self._results[i] for i in sorted(self._results)]
+        return [result for result in saved if result not in ("", None)]
@@ -0,0 +1,262 @@
+# pylint: disable = unspecified-encoding
+
+"""
+Compact binary capture format (`.wfb`).
+
+A file stores raw waveform codes as returned by the oscilloscope, along with the
+scaling preamble of each channel and the `KeysightConfig` used for the capture.
+
+Layout (little endian):
+    MAGIC (8 bytes) | header length (uint32) | JSON header | padding | data
+Data starts on a DATA_ALIGNMENT boundary and holds one (segments, points) array
+per channel, in header order, so it can be mapped with `numpy.memmap`.
+
+Usage:
+    python capture_file.py to-csv measurements/test.wfb
+    python capture_file.py to-wfb measurements/test.csv
+"""
+
+import argparse
+import dataclasses
+import json
+import logging
+import os
+import struct
+from typing import Dict, List, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+import csv_export
+from dataclass import Capture, FileFormat, KeysightConfig, Preamble, Waveform
+
+MAGIC = b"GIROWFB\x01"
+HEADER_LENGTH = struct.Struct("<I")
+DATA_ALIGNMENT = 64
+FORMAT_VERSION = 1
+EXTENSION = FileFormat.BINARY.value
+
+# Codes used when converting float data (e.g. CSV files) to this format
+CONVERTED_DTYPE = np.int16
+CONVERTED_LEVELS = 2**15 - 1
+
+logger = logging.getLogger(__name__)
+
+
+def _config_metadata(config: KeysightConfig) -> Dict:
+    """Return configuration as JSON serializable dict, enums being saved by name."""
+    return json.loads(json.dumps(dataclasses.asdict(config), default=lambda o: o.name))
+
+
+def encode_capture(
+    channels: Dict[str, Tuple[np.ndarray, Preamble]],
+    segment_times: np.ndarray = None,
+    config: KeysightConfig = None,
+    timestamp: float = None,
+) -> List[Union[bytes, np.ndarray]]:
+    """
+    Return blocks of a capture (header, then codes of each channel), to be written
+    in order. Codes are 1-D, or 2-D (segments, points) for segmented captures.
+    """
+    arrays = {name: np.atleast_2d(codes) for name, (codes, _) in channels.items()}
+    dtypes = {a.dtype for a in arrays.values()}
+    shapes = {a.shape for a in arrays.values()}
+    if len(dtypes) != 1 or len(shapes) != 1:
+        raise ValueError("All channels must share the same data type and shape.")
+    dtype, shape = dtypes.pop(), shapes.pop()
+
+    header = {
+        "version": FORMAT_VERSION,
+        "dtype": dtype.str,
+        "segments": shape[0],
+        "points": shape[1],
+        "channels": [
+            {"name": name, "preamble": dataclasses.asdict(preamble)}
+            for name, (_, preamble) in channels.items()
+        ],
+        "segment_times": [] if segment_times is None else list(map(float, segment_times)),
+        "timestamp": timestamp,
+        "config": None if config is None else _config_metadata(config),
+    }
+    header_bytes = json.dumps(header).encode("utf-8")
+    padding = _data_offset(len(header_bytes)) - len(MAGIC) - HEADER_LENGTH.size
+    prefix = MAGIC + HEADER_LENGTH.pack(len(header_bytes)) + header_bytes.ljust(padding, b"\0")
+    return [prefix] + [np.ascontiguousarray(array) for array in arrays.values()]
+
+
+def write_capture(
+    file_path: str,
+    channels: Dict[str, Tuple[np.ndarray, Preamble]],
+    segment_times: np.ndarray = None,
+    config: KeysightConfig = None,
+    timestamp: float = None,
+) -> None:
+    """
+    Write raw codes of each channel (name -> (codes, preamble)) to a capture file.
+    Codes are 1-D, or 2-D (segments, points) for segmented captures.
+    """
+    with open(file_path, "wb") as f:
+        for block in encode_capture(channels, segment_times, config, timestamp):
+            f.write(block)
+
+
+def _data_offset(header_length: int) -> int:
+    """Return offset of codes from the start of a capture, header being that long."""
+    data_offset = len(MAGIC) + HEADER_LENGTH.size + header_length
+    return data_offset + -data_offset % DATA_ALIGNMENT
+
+
+def read_header(file_path: str) -> Tuple[Dict, int]:
+    """Return capture header and data offset."""
+    with open(file_path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"'{file_path}' is not a capture file.")
+        (length,) = HEADER_LENGTH.unpack(f.read(HEADER_LENGTH.size))
+        header = json.loads(f.read(length).decode("utf-8"))
+    return header, _data_offset(length)
+
+
+def parse_header(buffer, offset: int = 0) -> Tuple[Dict, int]:
+    """
+    Return header and data offset (from `offset`) of a capture held in a buffer
+    (e.g. a memory map) at `offset`.
+    """
+    if bytes(buffer[offset : offset + len(MAGIC)]) != MAGIC:
+        raise ValueError(f"No capture at offset {offset}.")
+    (length,) = HEADER_LENGTH.unpack_from(buffer, offset + len(MAGIC))
+    start = offset + len(MAGIC) + HEADER_LENGTH.size
+    header = json.loads(bytes(buffer[start : start + length]).decode("utf-8"))
+    return header, _data_offset(length)
+
+
+def read_capture(file_path: str) -> Tuple[Dict, np.memmap]:
+    """
+    Map a capture file without copying it.
+    Return header and a read-only (channels, segments, points) array of raw codes.
+    """
+    header, data_offset = read_header(file_path)
+    shape = (len(header["channels"]), header["segments"], header["points"])
+    codes = np.memmap(
+        file_path,
+        dtype=np.dtype(header["dtype"]),
+        mode="r",
+        offset=data_offset,
+        shape=shape,
+    )
+    return header, codes
+
+
+def to_volts(codes: np.ndarray, preamble: Dict) -> np.ndarray:
+    """Scale raw codes to volts using a preamble, given as saved in header."""
+    return (codes - preamble["y_reference"]) * preamble["y_increment"] + preamble[
+        "y_origin"
+    ]
+
+
+def time_axis(header: Dict) -> np.ndarray:
+    """Return timestamp of every sample, segments being offset by their time tag."""
+    preamble = Preamble(**header["channels"][0]["preamble"])
+    return csv_export.time_axis(
+        preamble, header["points"], header["segments"], header["segment_times"]
+    )
+
+
+def to_capture(header: Dict, codes: np.ndarray, channels: List[str] = None) -> Capture:
+    """
+    Convert raw codes of a capture to volts, for every channel or only `channels`.
+    Waveforms are 1-D unless segmented, as collected by `KeysightDevice.collect`.
+    Its configuration is the metadata dict saved in the header, if any.
+    """
+    segment_times = np.asarray(header["segment_times"], dtype=np.float64)
+    waveforms = {}
+    for index, channel in enumerate(header["channels"]):
+        if channels is not None and channel["name"] not in channels:
+            continue
+        values = to_volts(codes[index], channel["preamble"])
+        if header["segments"] == 1:
+            values = values[0]
+        waveforms[channel["name"]] = Waveform(
+            channel["name"], values, Preamble(**channel["preamble"]), segment_times
+        )
+    return Capture(waveforms, segment_times, header["timestamp"], header["config"])
+
+
+def load_capture(file_path: str) -> Capture:
+    """Load a capture file as collected by `KeysightDevice.collect` (volts)."""
+    return to_capture(*read_capture(file_path))
+
+
+def capture_to_csv(file_path: str, csv_path: str) -> None:
+    """Convert a capture file to the CSV layout written by `KeysightDevice.save_measures`."""
+    header, codes = read_capture(file_path)
+    columns = [
+        to_volts(codes[index], channel["preamble"]).ravel()
+        for index, channel in enumerate(header["channels"])
+    ]
+    names = [channel["name"] for channel in header["channels"]]
+    csv_export.write_csv(csv_path, names, time_axis(header), columns)
+
+
+def _quantize(values: np.ndarray, x_increment: float, x_origin: float):
+    """Quantize float values to int16 codes, return codes and matching preamble."""
+    low, high = float(np.min(values)), float(np.max(values))
+    y_increment = (high - low) / (2 * CONVERTED_LEVELS) or 1.0
+    y_origin = (high + low) / 2
+    codes = np.round((values - y_origin) / y_increment).astype(CONVERTED_DTYPE)
+    preamble = Preamble(
+        format=1,
+        type=0,
+        points=len(values),
+        count=1,
+        x_increment=x_increment,
+        x_origin=x_origin,
+        x_reference=0.0,
+        y_increment=y_increment,
+        y_origin=y_origin,
+        y_reference=0.0,
+    )
+    return codes, preamble
+
+
+def csv_to_capture(csv_path: str, file_path: str) -> None:
+    """
+    Convert a CSV file to a capture file, values being quantized on 16 bits.
+    Timestamps are assumed evenly spaced (segments are merged into a single one).
+    """
+    df = pd.read_csv(csv_path)
+    if df.empty or "Timestamp" not in df.columns:
+        raise ValueError(f"CSV file '{csv_path}' is empty or has no Timestamp column.")
+
+    timestamps = df["Timestamp"].to_numpy(dtype=np.float64)
+    steps = np.diff(timestamps)
+    x_increment = float(np.median(steps)) if len(steps) else 0.0
+    if len(steps) and not np.allclose(steps, x_increment, rtol=1e-3):
+        logger.warning("'%s' timestamps are not evenly spaced", csv_path)
+
+    channels = {
+        name: _quantize(df[name].to_numpy(dtype=np.float64), x_increment, timestamps[0])
+        for name in df.columns
+        if name != "Timestamp"
+    }
+    write_capture(file_path, channels)
+
+
+def main(argv: List[str] = None):
+    """Command line converter between CSV and capture files."""
+    parser = argparse.ArgumentParser(description="Convert between CSV and .wfb files.")
+    parser.add_argument("direction", choices=["to-csv", "to-wfb"])
+    parser.add_argument("files", nargs="+")
+    args = parser.parse_args(argv)
+
+    for path in args.files:
+        base = os.path.splitext(path)[0]
+        if args.direction == "to-csv":
+            capture_to_csv(path, base + ".csv")
+        else:
+            csv_to_capture(path, base + EXTENSION)
+        logger.info("Converted %s", path)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -0,0 +1,94 @@
+"""
+Chunked CSV export of waveforms.
+
+Rows are written by chunks of CSV_CHUNK_ROWS so memory stays bounded whatever
+the capture size. Values use a fixed-point format ("%.<decimals>f"), rendered with
+NumPy integer arithmetic into a character matrix instead of one Python call per value.
+"""
+
+from typing import List
+
+import numpy as np
+
+from dataclass import Preamble
+
+CSV_CHUNK_ROWS = 65536
+TIME_DECIMALS = 12  # s, ps resolution
+VALUE_DECIMALS = 7  # V, beyond 16 bits ADC resolution on the smallest scale
+
+# Values beyond this limit (e.g. 9.9E+37 clipped ASCII samples) use Python formatting
+FIXED_POINT_LIMIT = 1e6
+PAD = 0  # Character matrix padding, removed before writing
+
+
+def time_axis(
+    preamble: Preamble, points: int, segments: int = 1, segment_times: np.ndarray = None
+) -> np.ndarray:
+    """
+    Return timestamp of every sample, computed from preamble x increment and origin.
+    Segments are offset by their trigger time tag, or laid back to back if unknown.
+    """
+    return preamble.time_axis(points, segments, segment_times).ravel()
+
+
+def _fixed_point_chars(values: np.ndarray, decimals: int) -> np.ndarray:
+    """Render values as "%.<decimals>f" in a (rows, width) uint8 matrix, PAD filled."""
+    scale = 10**decimals
+    scaled = np.rint(np.abs(values) * scale).astype(np.int64)
+    integer, fraction = np.divmod(scaled, scale)
+    int_width = len(str(int(integer.max()))) if len(integer) else 1
+
+    chars = np.full((len(values), 2 + int_width + decimals), PAD, dtype=np.uint8)
+    chars[:, 0] = np.where((values < 0) & (scaled > 0), ord("-"), PAD)
+    for k in range(int_width - 1, -1, -1):
+        # Leading zeros are padding, except for the units digit
+        chars[:, 1 + k] = np.where(
+            (integer > 0) | (k == int_width - 1), integer % 10 + ord("0"), PAD
+        )
+        integer //= 10
+    chars[:, 1 + int_width] = ord(".")
+    for k in range(decimals - 1, -1, -1):
+        fraction, digit = np.divmod(fraction, 10)
+        chars[:, 2 + int_width + k] = digit + ord("0")
+    return chars
+
+
+def _format_chunk(timestamps: np.ndarray, columns: List[np.ndarray]) -> bytes:
+    """Return CSV rows for a chunk of samples."""
+    decimals = [TIME_DECIMALS] + [VALUE_DECIMALS] * len(columns)
+    arrays = [timestamps] + columns
+
+    if not all(
+        np.all(np.abs(a) < FIXED_POINT_LIMIT) for a in arrays
+    ):  # Also catches NaN
+        row_format = ",".join(f"%.{d}f" for d in decimals) + "\n"
+        values = np.column_stack(arrays).ravel().tolist()
+        return ((row_format * len(timestamps)) % tuple(values)).encode()
+
+    rows = len(timestamps)
+    comma = np.full((rows, 1), ord(","), dtype=np.uint8)
+    newline = np.full((rows, 1), ord("\n"), dtype=np.uint8)
+    parts = []
+    for array, decimal in zip(arrays, decimals):
+        parts += [_fixed_point_chars(array, decimal), comma]
+    parts[-1] = newline
+    return np.hstack(parts).tobytes().replace(bytes([PAD]), b"")
+
+
+def write_csv(
+    file_path: str,
+    names: List[str],
+    timestamps: np.ndarray,
+    columns: List[np.ndarray],
+    chunk_rows: int = CSV_CHUNK_ROWS,
+) -> None:
+    """Write a Timestamp column followed by one column per name."""
+    with open(file_path, "wb") as f:
+        f.write((",".join(["Timestamp"] + names) + "\n").encode())
+        for start in range(0, len(timestamps), chunk_rows):
+            stop = start + chunk_rows
+            f.write(
+                _format_chunk(
+                    timestamps[start:stop], [column[start:stop] for column in columns]
+                )
+            )
@@ -1,10 +1,14 @@
 # pylint: disable = missing-module-docstring, invalid-name
 
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+import hashlib
 import logging
-from typing import List, Union
+from collections.abc import Mapping
+from typing import Dict, Iterator, List, Optional, Union
 from enum import Enum
 
+import numpy as np
+
 logger = logging.getLogger(__name__)
 
 # Constants for allowed values for waveform points
@@ -27,6 +31,15 @@ ALLOWED_WAVEFORM_POINTS = [
     2000000,
 ]
 
+# Horizontal divisions of the device screen, `horizontal_range` spans all of them
+HORIZONTAL_DIVISIONS = 10
+
+# Maximum number of segments for segmented memory acquisitions
+MAX_SEGMENTS = 1000
+
+# Maximum number of acquisitions averaged by the device
+MAX_AVERAGE_COUNT = 65536
+
 
 class TriggerSource(Enum):
     """Trigger name enumeration."""
@@ -68,6 +81,55 @@ class SlopeType(Enum):
     ALTERNATE = "ALT"
 
 
+class WaveformFormat(Enum):
+    """
+    Waveform transfer format enumeration.
+    Binary formats (BYTE/WORD) transfer raw ADC codes scaled with the preamble,
+    ASCII transfers pre-scaled values and is kept as a fallback.
+    """
+
+    ASCII = "ASCii"
+    BYTE = "BYTE"
+    WORD = "WORD"
+
+
+class FileFormat(Enum):
+    """
+    Measures file format enumeration, values are file extensions.
+    BINARY files store raw codes and scaling (see `capture_file.py`).
+    """
+
+    CSV = ".csv"
+    BINARY = ".wfb"
+
+
+class TriggerWait(Enum):
+    """
+    Trigger wait strategy enumeration.
+    SRQ relies on the device status byte (service request), POLL falls back
+    on reading the operation status register with an adaptive backoff.
+    """
+
+    SRQ = "srq"
+    POLL = "poll"
+
+
+class MeasurementType(Enum):
+    """
+    Oscilloscope measurement enumeration (`:MEASure` subsystem).
+    DELAY needs two sources, other measurements a single one.
+    """
+
+    DELAY = "DELay"
+    VPP = "VPP"
+    VMAX = "VMAX"
+    VMIN = "VMIN"
+    VRMS = "VRMS"
+    RISE_TIME = "RISetime"
+    FALL_TIME = "FALLtime"
+    FREQUENCY = "FREQuency"
+
+
 class TimeUnit(Enum):
     """
     Time unit enumeration.
@@ -79,6 +141,151 @@ class TimeUnit(Enum):
     US = 1e-6
 
 
+@dataclass
+class Preamble:
+    """
+    Waveform scaling parameters, as returned by `:WAVeform:PREamble?`.
+    voltage = (code - y_reference) * y_increment + y_origin
+    time = (index - x_reference) * x_increment + x_origin
+    """
+
+    format: int
+    type: int
+    points: int
+    count: int
+    x_increment: float
+    x_origin: float
+    x_reference: float
+    y_increment: float
+    y_origin: float
+    y_reference: float
+
+    @classmethod
+    def from_query(cls, answer: str) -> "Preamble":
+        """Build a preamble from the comma separated device answer."""
+        fields = answer.strip().split(",")
+        if len(fields) != 10:
+            raise ValueError(f"Invalid waveform preamble: '{answer}'")
+        ints = [int(float(v)) for v in fields[:4]]
+        floats = [float(v) for v in fields[4:]]
+        return cls(*ints, *floats)
+
+    def time_axis(
+        self, points: int, segments: int = 1, segment_times: np.ndarray = None
+    ) -> np.ndarray:
+        """
+        Return a (segments, points) array of sample times.
+        Segments are offset by their trigger time tag, or laid back to back if unknown.
+        """
+        local = (np.arange(points) - self.x_reference) * self.x_increment
+        local += self.x_origin
+
+        if segment_times is None or len(segment_times) != segments:
+            segment_times = np.arange(segments) * points * self.x_increment
+        return np.asarray(segment_times, dtype=np.float64)[:, None] + local
+
+
+class Waveform:
+    """
+    Samples of a single channel in volts: 1-D, or (segments, points) for segmented
+    captures. The time axis is only computed when first accessed.
+    """
+
+    __slots__ = ("name", "values", "preamble", "segment_times", "_time")
+
+    def __init__(
+        self,
+        name: str,
+        values: np.ndarray,
+        preamble: Optional[Preamble] = None,
+        segment_times: Optional[np.ndarray] = None,
+    ):
+        self.name = name
+        self.values = values
+        self.preamble = preamble
+        self.segment_times = segment_times
+        self._time = None
+
+    @property
+    def points(self) -> int:
+        return np.shape(self.values)[-1] if np.ndim(self.values) else 0
+
+    @property
+    def segments(self) -> int:
+        return np.shape(self.values)[0] if np.ndim(self.values) > 1 else 1
+
+    @property
+    def x_increment(self) -> Optional[float]:
+        return self.preamble.x_increment if self.preamble else None
+
+    @property
+    def time(self) -> np.ndarray:
+        """Sample times (s), same shape as values. Requires a preamble."""
+        if self._time is None:
+            if self.preamble is None:
+                raise ValueError(f"No preamble for waveform '{self.name}'.")
+            times = self.preamble.time_axis(
+                self.points, self.segments, self.segment_times
+            )
+            self._time = times.reshape(np.shape(self.values))
+        return self._time
+
+    @property
+    def nbytes(self) -> int:
+        return self.values.nbytes
+
+
+class Capture(Mapping):
+    """
+    Waveforms of a single acquisition, keyed by channel name, with the host time of
+    the trigger (s since epoch) and the configuration it was acquired with: the
+    `KeysightConfig` when collected, its saved metadata (dict) when loaded from a
+    capture file or archive. Indexing returns the values array of a channel,
+    like a dict of arrays.
+    """
+
+    __slots__ = ("waveforms", "segment_times", "timestamp", "config")
+
+    def __init__(
+        self,
+        waveforms: Dict[str, Waveform] = None,
+        segment_times: Optional[np.ndarray] = None,
+        timestamp: Optional[float] = None,
+        config: Optional[Union["KeysightConfig", Dict]] = None,
+    ):
+        self.waveforms = waveforms or {}
+        self.segment_times = np.empty(0) if segment_times is None else segment_times
+        self.timestamp = timestamp
+        self.config = config
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self.waveforms[name].values
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.waveforms)
+
+    def __len__(self) -> int:
+        return len(self.waveforms)
+
+    def waveform(self, name: str) -> Waveform:
+        return self.waveforms[name]
+
+    @property
+    def preambles(self) -> Dict[str, Preamble]:
+        return {
+            name: w.preamble for name, w in self.waveforms.items() if w.preamble is not None
+        }
+
+    @property
+    def time(self) -> np.ndarray:
+        """Time axis of the first channel."""
+        return next(iter(self.waveforms.values())).time
+
+    @property
+    def nbytes(self) -> int:
+        return sum(w.nbytes for w in self.waveforms.values())
+
+
 @dataclass
 class Channel:
     """Represents a measurement channel."""
@@ -129,6 +336,48 @@ class Channel:
             raise ValueError("Probe ratio must be between 0.1 and 10000.")
 
 
+@dataclass
+class Measurement:
+    """
+    Represents a measurement computed by the device on each acquisition.
+    Sources are channel numbers, `source2` is only used by DELAY.
+    """
+
+    name: str
+    type: MeasurementType
+    source: int
+    source2: Optional[int] = None
+
+    def __post_init__(self):
+        self._validate_types()
+        self._validate_values()
+
+    @property
+    def sources(self) -> str:
+        """Return SCPI sources argument, e.g. "CHANnel1,CHANnel2"."""
+        numbers = [self.source] if self.source2 is None else [self.source, self.source2]
+        return ",".join(f"CHANnel{n}" for n in numbers)
+
+    def _validate_types(self):
+        if not isinstance(self.name, str):
+            raise TypeError("Measurement name must be a string.")
+        if not isinstance(self.type, MeasurementType):
+            raise TypeError("Invalid measurement type.")
+        if not isinstance(self.source, int):
+            raise TypeError("Measurement source must be a channel number.")
+        if self.source2 is not None and not isinstance(self.source2, int):
+            raise TypeError("Measurement second source must be a channel number.")
+
+    def _validate_values(self):
+        if not self.name:
+            raise ValueError("Measurement name must not be empty.")
+        for number in (self.source, self.source2):
+            if number is not None and not 1 <= number <= 4:
+                raise ValueError("Measurement sources must be between 1 and 4.")
+        if (self.type == MeasurementType.DELAY) != (self.source2 is not None):
+            raise ValueError("A second source is required by DELAY measurements only.")
+
+
 @dataclass
 class Trigger:
     """Represents a trigger configuration."""
@@ -170,32 +419,65 @@ class KeysightConfig:
     frequency: int = 1
     frequency_unit: FrequencyUnit = FrequencyUnit.HZ
 
+    waveform_format: WaveformFormat = WaveformFormat.WORD
+
+    segment_count: int = 1  # > 1 enables segmented memory acquisitions
+    average_count: int = 1  # > 1 enables averaging on the device
+
+    trigger_wait: TriggerWait = TriggerWait.SRQ
+    trigger_timeout: Optional[Union[float | int]] = 30  # s, None waits forever
+
+    # Computed by the device, read by `KeysightDevice.measure` without waveforms
+    measurements: List[Measurement] = field(default_factory=list)
+
     def __post_init__(self):
         self._validate_types()
         self._validate_values()
 
-        # Compute how many points to extract based on provided time/frequency
-        time_range_sec = 10 * self.horizontal_range * self.horizontal_unit.value
-        freq_hz = self.frequency * self.frequency_unit.value
-        desired_points = int(time_range_sec * freq_hz)
+        # Averaged waveforms have more than 8 bits of resolution
+        if self.average_count > 1 and self.waveform_format == WaveformFormat.BYTE:
+            logger.warning("Averaged waveforms are transferred as WORD, not BYTE")
+            self.waveform_format = WaveformFormat.WORD
 
         # Warn if it’s not one of the allowed values
-        if desired_points not in ALLOWED_WAVEFORM_POINTS:
-            closest_pts = min(
-            ALLOWED_WAVEFORM_POINTS,
-                key=lambda p: abs(p - desired_points)
-            )
-            actual_freq = closest_pts / time_range_sec
-
-
+        if self.desired_points not in ALLOWED_WAVEFORM_POINTS:
             logger.critical(
                 """Requested number of waveform points (%d) is not in allowed set.
                 Number of points will be clamped to closest allowed value: %dpoints, %f """,
-                desired_points,
-                closest_pts,
-                actual_freq
+                self.desired_points,
+                self.waveform_points,
+                self.sample_rate,
             )
 
+    @property
+    def time_range(self) -> float:
+        """Acquisition window (all divisions), in seconds."""
+        return self.horizontal_range * self.horizontal_unit.value
+
+    @property
+    def desired_points(self) -> int:
+        """
+        Points per channel requested by the time range and frequency: `frequency`
+        samples per second over HORIZONTAL_DIVISIONS windows (the tool's historical
+        convention). The actual sample rate is `sample_rate`.
+        """
+        frequency = self.frequency * self.frequency_unit.value
+        return round(HORIZONTAL_DIVISIONS * self.time_range * frequency)
+
+    @property
+    def waveform_points(self) -> int:
+        """Points per channel actually transferred: closest allowed value."""
+        return min(ALLOWED_WAVEFORM_POINTS, key=lambda p: abs(p - self.desired_points))
+
+    @property
+    def sample_rate(self) -> float:
+        """Effective sample rate of transferred waveforms, in Sa/s."""
+        return self.waveform_points / self.time_range
+
+    def digest(self) -> str:
+        """Return a hash of the whole configuration (channels and trigger included)."""
+        return hashlib.sha1(repr(self).encode()).hexdigest()
+
     def _validate_types(self):
         if not isinstance(self.channels, list):
             raise TypeError("Channels must be a list.")
@@ -211,6 +493,22 @@ class KeysightConfig:
             raise TypeError("Frequency must be a number.")
         if not isinstance(self.frequency_unit, FrequencyUnit):
             raise TypeError("Invalid frequency unit.")
+        if not isinstance(self.waveform_format, WaveformFormat):
+            raise TypeError("Invalid waveform format.")
+        if not isinstance(self.segment_count, int):
+            raise TypeError("Segment count must be an integer.")
+        if not isinstance(self.average_count, int):
+            raise TypeError("Average count must be an integer.")
+        if not isinstance(self.trigger_wait, TriggerWait):
+            raise TypeError("Invalid trigger wait strategy.")
+        if self.trigger_timeout is not None and not isinstance(
+            self.trigger_timeout, (int, float)
+        ):
+            raise TypeError("Trigger timeout must be a number or None.")
+        if not isinstance(self.measurements, list) or not all(
+            isinstance(m, Measurement) for m in self.measurements
+        ):
+            raise TypeError("Measurements must be a list of Measurement instances.")
 
     def _validate_values(self):
         if not self.channels:
@@ -219,3 +517,20 @@ class KeysightConfig:
             raise ValueError("Frequency must be positive.")
         if self.horizontal_range <= 0:
             raise ValueError("Horizontal range must be positive.")
+        if not 1 <= self.segment_count <= MAX_SEGMENTS:
+            raise ValueError(f"Segment count must be between 1 and {MAX_SEGMENTS}.")
+        if not 1 <= self.average_count <= MAX_AVERAGE_COUNT:
+            raise ValueError(
+                f"Average count must be between 1 and {MAX_AVERAGE_COUNT}."
+            )
+        if self.average_count > 1 and self.segment_count > 1:
+            raise ValueError("Averaging is not available with segmented acquisitions.")
+        if self.trigger_timeout is not None and self.trigger_timeout <= 0:
+            raise ValueError("Trigger timeout must be positive.")
+        numbers = {ch.number for ch in self.channels}
+        for m in self.measurements:
+            if not {m.source, m.source2 or m.source} <= numbers:
+                raise ValueError(f"Measurement '{m.name}' sources must be enabled channels.")
+        names = [m.name for m in self.measurements]
+        if len(set(names)) != len(names):
+            raise ValueError("Measurement names must be unique.")
@@ -0,0 +1,88 @@
+"""
+Waveform decimation for display.
+
+Reduces a trace to a point budget (about the plot width in pixels) while keeping
+its visual shape:
+- MINMAX keeps the extrema of each bucket, so bursts and spikes are never hidden.
+- LTTB (Largest Triangle Three Buckets) keeps the most significant point of each bucket.
+"""
+
+from enum import Enum
+from typing import Tuple
+
+import numpy as np
+
+
+class DecimationMethod(Enum):
+    """Decimation algorithm enumeration."""
+
+    MINMAX = "minmax"
+    LTTB = "lttb"
+
+
+def minmax_decimate(
+    x: np.ndarray, y: np.ndarray, max_points: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Keep min and max of each bucket, in time order (returns up to max_points)."""
+    buckets = max(1, max_points // 2)
+    size = len(y) // buckets
+    if size < 2:
+        return x, y
+
+    # The last bucket also takes the tail not filling a whole bucket
+    usable = size * (buckets - 1)
+    blocks = y[:usable].reshape(buckets - 1, size)
+    offsets = np.arange(buckets - 1) * size
+    tail = y[usable:]
+    low = np.append(blocks.argmin(axis=1) + offsets, tail.argmin() + usable)
+    high = np.append(blocks.argmax(axis=1) + offsets, tail.argmax() + usable)
+
+    indices = np.sort(np.concatenate([low, high]))
+    return x[indices], y[indices]
+
+
+def lttb_decimate(
+    x: np.ndarray, y: np.ndarray, max_points: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Largest Triangle Three Buckets decimation, first and last points are kept."""
+    n = len(y)
+    if max_points >= n or max_points < 3:
+        return x, y
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    edges = np.linspace(1, n - 1, max_points - 1).astype(np.int64)
+    indices = np.empty(max_points, dtype=np.int64)
+    indices[0], indices[-1] = 0, n - 1
+
+    selected = 0
+    for i in range(max_points - 2):
+        start, stop = edges[i], edges[i + 1]
+        # Third point: average of next bucket (last point for the last bucket)
+        next_stop = edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[stop:next_stop].mean() if next_stop > stop else x[-1]
+        avg_y = y[stop:next_stop].mean() if next_stop > stop else y[-1]
+
+        area = np.abs(
+            (x[selected] - avg_x) * (y[start:stop] - y[selected])
+            - (x[selected] - x[start:stop]) * (avg_y - y[selected])
+        )
+        selected = start + int(area.argmax())
+        indices[i + 1] = selected
+
+    return x[indices], y[indices]
+
+
+def decimate(
+    x: np.ndarray,
+    y: np.ndarray,
+    max_points: int,
+    method: DecimationMethod = DecimationMethod.MINMAX,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Reduce (x, y) to about `max_points` points."""
+    x, y = np.asarray(x), np.asarray(y)
+    if len(y) <= max_points:
+        return x, y
+    if method == DecimationMethod.LTTB:
+        return lttb_decimate(x, y, max_points)
+    return minmax_decimate(x, y, max_points)
@@ -0,0 +1,236 @@
+"""
+Parallel acquisition on several oscilloscopes.
+
+A `KeysightGroup` drives one `KeysightDevice` per scope, all opened through a
+single VISA resource manager. Each device has its own worker thread, so slow
+transfers overlap and throughput scales with the number of scopes. All scopes
+are armed before any of them is waited for, and their captures are gathered
+into a single record on the time axis of the first (reference) device.
+
+Scope clocks are not synchronized: the skew of each device is measured by
+cross-correlating a signal wired to every scope (e.g. the emitter burst), see
+`sync_channels`. Without it, captures are assumed simultaneous: host timestamps
+of trigger completion are only reported, their jitter (several ms) exceeding
+the capture window.
+"""
+
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, NamedTuple, Optional
+
+import numpy as np
+import pyvisa
+
+import analysis
+import csv_export
+from keysight import KeysightDevice, RawCapture
+
+# Host skew estimates beyond this many samples are reported as a warning
+HOST_SKEW_WARNING_SAMPLES = 4
+
+logger = logging.getLogger(__name__)
+
+
+class GroupCapture(NamedTuple):
+    """Transferred captures and host time at which each acquisition completed (s)."""
+
+    captures: Dict[str, RawCapture]
+    completed: Dict[str, float]
+    timestamp: float
+
+
+class GroupRecord(NamedTuple):
+    """
+    Time aligned waveforms of all devices, skew applied to each device (s) and
+    skew estimated from host completion times (s), only informative.
+    """
+
+    waveforms: Dict[str, np.ndarray]
+    skews: Dict[str, float]
+    timestamp: float
+    host_skews: Dict[str, float]
+
+
+class KeysightGroup:
+    """
+    Devices driven together, keyed by name (the first one being the reference).
+    Channel names must be unique across the group, since records merge them.
+    `sync_channels` names, for each device, a channel carrying the same signal.
+    """
+
+    def __init__(
+        self,
+        devices: Dict[str, KeysightDevice],
+        sync_channels: Optional[Dict[str, str]] = None,
+    ):
+        if not devices:
+            raise ValueError("At least one device is required.")
+        names = [ch.name for device in devices.values() for ch in device.config.channels]
+        duplicates = {name for name in names if names.count(name) > 1}
+        if duplicates:
+            raise ValueError(f"Duplicate channel names in group: {sorted(duplicates)}")
+
+        self.devices = devices
+        self.reference = next(iter(devices))
+        self.sync_channels = sync_channels or {}
+        self.resource_manager = None
+        self._executors = {
+            name: ThreadPoolExecutor(max_workers=1, thread_name_prefix=name)
+            for name in devices
+        }
+
+    def _run(self, action: Callable[[str, KeysightDevice], object]) -> Dict[str, object]:
+        """Run an action on every device in its worker, return results by device name."""
+        futures = {
+            name: self._executors[name].submit(action, name, device)
+            for name, device in self.devices.items()
+        }
+        return {name: future.result() for name, future in futures.items()}
+
+    def connect(
+        self,
+        addresses: Optional[Dict[str, str]] = None,
+        force_reset: bool = False,
+        resource_manager: pyvisa.ResourceManager = None,
+    ):
+        """
+        Connect every device through a shared resource manager.
+        Devices without address take the remaining listed resources, in order.
+        """
+        self.resource_manager = resource_manager or pyvisa.ResourceManager()
+        addresses = dict(addresses or {})
+        available = [
+            address
+            for address in self.resource_manager.list_resources()
+            if address not in addresses.values()
+        ]
+        for name in self.devices:
+            if name not in addresses:
+                if not available:
+                    raise ValueError(f"No VISA resource left for device '{name}'.")
+                addresses[name] = available.pop(0)
+
+        self._run(
+            lambda name, device: device.connect(
+                addresses[name], force_reset, self.resource_manager
+            )
+        )
+
+    def setup(self):
+        """Set up every device with its configuration."""
+        self._run(lambda _, device: device.setup())
+
+    def acquire(self) -> Optional[Dict[str, float]]:
+        """
+        Arm all devices, then wait for all of them.
+        Return host time at which each acquisition completed, or None on failure.
+        """
+        strategies = self._run(lambda _, device: device.arm())
+        failed = [name for name, strategy in strategies.items() if strategy is None]
+        if failed:
+            logger.error("Failed arming devices: %s", ", ".join(failed))
+            return None
+
+        def wait(name: str, device: KeysightDevice) -> Optional[float]:
+            return time.perf_counter() if device.wait(strategies[name]) else None
+
+        completed = self._run(wait)
+        failed = [name for name, done in completed.items() if done is None]
+        if failed:
+            logger.error("Acquisition failed on devices: %s", ", ".join(failed))
+            return None
+        return completed
+
+    def transfer(self, completed: Dict[str, float]) -> GroupCapture:
+        """Transfer captures of all devices, without parsing them."""
+        captures = self._run(lambda _, device: device.transfer())
+        return GroupCapture(captures, completed, time.time())
+
+    def capture(self) -> Optional[GroupCapture]:
+        """Acquire and transfer a capture on every device."""
+        completed = self.acquire()
+        if completed is None:
+            return None
+        return self.transfer(completed)
+
+    def _sync_skew(
+        self, waveforms: Dict[str, Dict[str, np.ndarray]], name: str, x_increment: float
+    ) -> Optional[float]:
+        """Return skew of a device from its sync channel, None if unavailable."""
+        ref = waveforms[self.reference].get(self.sync_channels.get(self.reference))
+        values = waveforms[name].get(self.sync_channels.get(name))
+        if ref is None or values is None or not ref.size or ref.shape != values.shape:
+            return None
+
+        # Skew may be negative: search both ways, keep the best correlation
+        late = analysis.estimate_delays(ref, values, x_increment)
+        early = analysis.estimate_delays(values, ref, x_increment)
+        if late.score.mean() >= early.score.mean():
+            return float(late.delay.mean())
+        return -float(early.delay.mean())
+
+    def align(self, capture: GroupCapture) -> GroupRecord:
+        """
+        Parse all channels onto the time axis of the reference device.
+        Samples outside a device capture are NaN.
+        """
+        waveforms = self._run(lambda name, device: device.parse(capture.captures[name]))
+        reference_channels = capture.captures[self.reference].channels
+        if not reference_channels:
+            raise ValueError("Reference device capture is empty.")
+        ref_preamble = next(iter(reference_channels.values()))[1]
+        ref_points = np.shape(next(iter(waveforms[self.reference].values())))[-1]
+        ref_axis = csv_export.time_axis(ref_preamble, ref_points)
+
+        record = dict(waveforms[self.reference])
+        skews = {self.reference: 0.0}
+        host_skews = {self.reference: 0.0}
+        for name, channels in waveforms.items():
+            if name == self.reference:
+                continue
+            # A device completing later triggered later: its samples come earlier
+            host_skew = capture.completed[self.reference] - capture.completed[name]
+            host_skews[name] = host_skew
+            skew = self._sync_skew(waveforms, name, ref_preamble.x_increment)
+            if skew is None:
+                # Host timestamps jitter more than a capture lasts: not applied
+                skew = 0.0
+                if abs(host_skew) > HOST_SKEW_WARNING_SAMPLES * ref_preamble.x_increment:
+                    logger.warning(
+                        "Device '%s' completed %.3f ms apart from the reference, "
+                        "captures are assumed simultaneous (no sync channel)",
+                        name,
+                        -host_skew * 1e3,
+                    )
+            skews[name] = skew
+            logger.debug("Device '%s' skew: %.3e s (host %.3e s)", name, skew, host_skew)
+
+            for channel, values in channels.items():
+                if not np.size(values):
+                    record[channel] = values
+                    continue
+                preamble = capture.captures[name].channels[channel][1]
+                rows = np.atleast_2d(values)
+                axis = csv_export.time_axis(preamble, rows.shape[-1])
+                aligned = np.array(
+                    [
+                        np.interp(ref_axis + skew, axis, row, left=np.nan, right=np.nan)
+                        for row in rows
+                    ]
+                )
+                record[channel] = aligned if np.ndim(values) > 1 else aligned[0]
+        return GroupRecord(record, skews, capture.timestamp, host_skews)
+
+    def collect(self) -> Optional[GroupRecord]:
+        """Acquire, transfer and align a capture of every device."""
+        capture = self.capture()
+        if capture is None:
+            return None
+        return self.align(capture)
+
+    def release(self):
+        """Release all devices and stop their workers."""
+        self._run(lambda _, device: device.release())
+        for executor in self._executors.values():
+            executor.shutdown()
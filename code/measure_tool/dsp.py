@@ -0,0 +1,268 @@
+"""
+Streaming band-pass filtering and burst arrival detection.
+
+Receiver channels carry 8 cycles bursts at the transducer frequency
+(`LEDC_FREQUENCY` in `code_test.c`), buried in noise. They are filtered with a
+complex FIR: a windowed-sinc low-pass shifted to the transducer frequency. Its
+output is the analytic signal of the band-passed input: the real part is the
+filtered waveform, the magnitude is the (quadrature) envelope.
+
+Filtering is done by FFT overlap-save on chunks, the filter keeping the tail of
+each chunk, so long captures stream in bounded memory. Every row (segment) of a
+chunk is filtered in the same NumPy call, with its own state.
+Arrival times are detected on the envelope by threshold crossing and by peak,
+and corrected by the filter group delay. `detect_bursts` and `detect_bursts_file`
+return them on the capture time axis (see `Preamble.time_axis`, trigger at 0).
+"""
+
+import math
+from typing import Dict, Iterator, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+import capture_file
+from dataclass import Capture, Preamble
+
+TRANSDUCER_FREQUENCY = 41700  # Hz, see code_test.c
+DEFAULT_BANDWIDTH = 10e3  # Hz, about twice the 8 cycles burst bandwidth
+DEFAULT_CHUNK_POINTS = 65536
+WINDOW_BETA = 8.0  # Kaiser window, ~80 dB stop band attenuation
+TAPS_PER_BANDWIDTH = 4  # Filter length, in periods of the bandwidth
+
+
+def design_bandpass(
+    sample_rate: float,
+    center: float = TRANSDUCER_FREQUENCY,
+    bandwidth: float = DEFAULT_BANDWIDTH,
+    taps: Optional[int] = None,
+) -> np.ndarray:
+    """
+    Return complex FIR taps passing [center - bandwidth / 2, center + bandwidth / 2],
+    with unit gain on the analytic signal (negative frequencies are rejected).
+    """
+    if not 0 < center < sample_rate / 2:
+        raise ValueError("Center frequency must be below half the sample rate.")
+    if taps is None:
+        taps = int(TAPS_PER_BANDWIDTH * sample_rate / bandwidth) | 1  # Odd length
+    cutoff = bandwidth / 2 / sample_rate
+
+    n = np.arange(taps) - (taps - 1) / 2
+    lowpass = np.sinc(2 * cutoff * n) * np.kaiser(taps, WINDOW_BETA)
+    lowpass /= lowpass.sum()
+    return lowpass * np.exp(2j * np.pi * center / sample_rate * n)
+
+
+def _fft_length(size: int) -> int:
+    """Return the smallest power of two above size."""
+    return 1 << (size - 1).bit_length()
+
+
+class StreamingFilter:
+    """
+    FIR filter applied chunk after chunk (overlap-save), rows being independent.
+    The output of sample i is delayed by `delay` samples.
+    """
+
+    def __init__(self, taps: np.ndarray):
+        self.taps = np.asarray(taps)
+        self.delay = (len(taps) - 1) / 2
+        self._state = None  # Last len(taps) - 1 input samples of each row
+        self._spectra = {}  # FFT length -> taps spectrum
+
+    def _spectrum(self, nfft: int) -> np.ndarray:
+        spectrum = self._spectra.get(nfft)
+        if spectrum is None:
+            spectrum = self._spectra[nfft] = np.fft.fft(self.taps, nfft)
+        return spectrum
+
+    def reset(self):
+        self._state = None
+
+    def process(self, chunk: np.ndarray) -> np.ndarray:
+        """Filter the next chunk, of shape (points,) or (rows, points)."""
+        rows = np.atleast_2d(chunk)
+        overlap = len(self.taps) - 1
+        if self._state is None or self._state.shape[0] != rows.shape[0]:
+            self._state = np.zeros((rows.shape[0], overlap), dtype=rows.dtype)
+
+        extended = np.concatenate([self._state, rows], axis=1)
+        nfft = _fft_length(extended.shape[1])
+        spectrum = np.fft.fft(extended, nfft, axis=1) * self._spectrum(nfft)
+        output = np.fft.ifft(spectrum, axis=1)[:, overlap : extended.shape[1]]
+
+        self._state = extended[:, extended.shape[1] - overlap :]
+        return output if np.ndim(chunk) > 1 else output[0]
+
+
+class Detection(NamedTuple):
+    """Burst detection of each row: arrival (s, NaN if none), peak time (s) and amplitude."""
+
+    arrival: np.ndarray
+    peak_time: np.ndarray
+    peak: np.ndarray
+
+
+class ArrivalDetector:
+    """
+    Streaming detection on an envelope: first crossing of `threshold` (V, linear
+    interpolation between samples) and time of the envelope maximum.
+    Times are relative to the first sample, minus `delay` samples.
+    """
+
+    def __init__(
+        self, sample_rate: float, threshold: Optional[float] = None, delay: float = 0.0
+    ):
+        self.sample_rate = sample_rate
+        self.threshold = threshold
+        self.delay = delay
+        self._offset = 0  # Samples processed so far
+        self._previous = None  # Last envelope sample of each row
+        self._arrival = None
+        self._peak = None
+        self._peak_index = None
+
+    def process(self, envelope: np.ndarray):
+        rows = np.atleast_2d(envelope)
+        count, points = rows.shape
+        if self._arrival is None:
+            self._arrival = np.full(count, np.nan)
+            self._peak = np.full(count, -np.inf)
+            self._peak_index = np.zeros(count)
+            self._previous = rows[:, 0].copy()
+
+        index = rows.argmax(axis=1)
+        values = rows[np.arange(count), index]
+        better = values > self._peak
+        self._peak[better] = values[better]
+        self._peak_index[better] = index[better] + self._offset
+
+        if self.threshold is not None:
+            pending = np.isnan(self._arrival)
+            above = rows >= self.threshold
+            found = pending & above.any(axis=1)
+            first = above.argmax(axis=1)
+            before = np.where(
+                first > 0,
+                rows[np.arange(count), np.maximum(first - 1, 0)],
+                self._previous,
+            )
+            after = rows[np.arange(count), first]
+            with np.errstate(invalid="ignore", divide="ignore"):
+                fraction = np.clip((self.threshold - before) / (after - before), 0, 1)
+            fraction = np.nan_to_num(fraction, nan=1.0)
+            crossing = self._offset + first - 1 + fraction
+            self._arrival[found] = crossing[found]
+
+        self._previous = rows[:, -1].copy()
+        self._offset += points
+
+    def result(self) -> Detection:
+        if self._arrival is None:
+            empty = np.empty(0)
+            return Detection(empty, empty, empty)
+        return Detection(
+            (self._arrival - self.delay) / self.sample_rate,
+            (self._peak_index - self.delay) / self.sample_rate,
+            self._peak.copy(),
+        )
+
+
+class BurstProcessor:
+    """Band-pass filter and arrival detector of a single channel, fed by chunks."""
+
+    def __init__(
+        self,
+        sample_rate: float,
+        threshold: Optional[float] = None,
+        center: float = TRANSDUCER_FREQUENCY,
+        bandwidth: float = DEFAULT_BANDWIDTH,
+    ):
+        self.filter = StreamingFilter(design_bandpass(sample_rate, center, bandwidth))
+        self.detector = ArrivalDetector(sample_rate, threshold, self.filter.delay)
+
+    def process(self, chunk: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Return filtered waveform and envelope of a chunk (both delayed by the filter)."""
+        analytic = self.filter.process(chunk)
+        # Analytic signal holds half the amplitude of the real input
+        filtered, envelope = 2 * analytic.real, 2 * np.abs(analytic)
+        self.detector.process(envelope)
+        return filtered, envelope
+
+    def result(self) -> Detection:
+        return self.detector.result()
+
+
+def _first_sample_time(preamble: Optional[Preamble]) -> float:
+    """Return time of the first sample of a segment, on the capture time axis."""
+    if preamble is None:
+        return 0.0
+    return preamble.x_origin - preamble.x_reference * preamble.x_increment
+
+
+def _shifted(detection: Detection, offset: float) -> Detection:
+    return Detection(detection.arrival + offset, detection.peak_time + offset, detection.peak)
+
+
+def _chunks(values: np.ndarray, chunk_points: int) -> Iterator[np.ndarray]:
+    for start in range(0, np.shape(values)[-1], chunk_points):
+        yield values[..., start : start + chunk_points]
+
+
+def detect_bursts(
+    waveforms: Dict[str, np.ndarray],
+    sample_rate: Optional[float] = None,
+    threshold: Optional[float] = None,
+    chunk_points: int = DEFAULT_CHUNK_POINTS,
+    **filter_args,
+) -> Dict[str, Detection]:
+    """
+    Detect bursts on every channel of a capture (e.g. `KeysightDevice.collect()`),
+    waveforms being 1-D or (segments, points). Filtered data is not kept.
+    Times are on the capture time axis, from the preambles of a `Capture`;
+    plain arrays are taken as starting at the trigger.
+    `sample_rate` defaults to the preamble one, it is required for plain arrays.
+    """
+    results = {}
+    for name, values in waveforms.items():
+        if not np.size(values):
+            continue
+        preamble = waveforms.waveform(name).preamble if isinstance(waveforms, Capture) else None
+        rate = sample_rate
+        if rate is None:
+            if preamble is None:
+                raise ValueError("sample_rate is required for waveforms without preamble.")
+            rate = 1 / preamble.x_increment
+        processor = BurstProcessor(rate, threshold, **filter_args)
+        for chunk in _chunks(values, chunk_points):
+            processor.process(chunk)
+        results[name] = _shifted(processor.result(), _first_sample_time(preamble))
+    return results
+
+
+def detect_bursts_file(
+    file_path: str,
+    threshold: Optional[float] = None,
+    chunk_points: int = DEFAULT_CHUNK_POINTS,
+    **filter_args,
+) -> Dict[str, Detection]:
+    """
+    Detect bursts on a binary capture file, mapped and converted chunk by chunk.
+    Times are on the capture time axis, as with `detect_bursts` on a `Capture`.
+    """
+    header, codes = capture_file.read_capture(file_path)
+    sample_rate = 1 / header["channels"][0]["preamble"]["x_increment"]
+
+    results = {}
+    for index, channel in enumerate(header["channels"]):
+        processor = BurstProcessor(sample_rate, threshold, **filter_args)
+        for chunk in _chunks(codes[index], chunk_points):
+            processor.process(capture_file.to_volts(chunk, channel["preamble"]))
+        offset = _first_sample_time(Preamble(**channel["preamble"]))
+        results[channel["name"]] = _shifted(processor.result(), offset)
+    return results
+
+
+def noise_threshold(envelope: np.ndarray, factor: float = 5.0) -> float:
+    """Return a detection threshold `factor` times the median envelope (noise floor)."""
+    level = float(np.median(envelope))
+    return factor * level if math.isfinite(level) else math.nan
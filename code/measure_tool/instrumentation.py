@@ -0,0 +1,181 @@
+"""
+Timing instrumentation of SCPI I/O and processing stages.
+
+A `Profiler` records the latency of every SCPI command (histogram per header),
+the duration of processing stages (setup, wait, transfer, parse, save, plot...)
+and bytes moved by each of them. `NULL_PROFILER` is used when profiling is
+disabled: its methods do nothing, so instrumented code only pays a method call.
+
+Usage:
+    device = KeysightDevice(config, profiler=Profiler("profile.json"))
+    ...
+    device.release()  # Report written to profile.json
+"""
+
+import functools
+import json
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List
+
+BATCH_HEADER = "<batch>"  # Compound messages sent by `KeysightDevice.batch`
+
+
+def scpi_header(command: str) -> str:
+    """
+    Return the header of a SCPI command, in upper case, without arguments.
+    Compound commands (e.g. ":SINGle;*OPC?") keep the header of each part.
+    """
+    parts = [part.strip() for part in command.split(";") if part.strip()]
+    return ";".join(part.split(" ", 1)[0].upper() for part in parts)
+
+
+class LatencyHistogram:
+    """Durations count in power of two microseconds buckets, with totals."""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = 0.0
+        self.nbytes = 0
+        self.buckets: List[int] = []
+
+    def add(self, seconds: float, nbytes: int = 0):
+        self.count += 1
+        self.total += seconds
+        self.min = min(self.min, seconds)
+        self.max = max(self.max, seconds)
+        self.nbytes += nbytes
+
+        # Bucket k holds durations below 2^k us
+        bucket = int(seconds * 1e6).bit_length()
+        if bucket >= len(self.buckets):
+            self.buckets.extend([0] * (bucket + 1 - len(self.buckets)))
+        self.buckets[bucket] += 1
+
+    def report(self) -> Dict:
+        report = {
+            "count": self.count,
+            "total_s": self.total,
+            "mean_ms": self.total / self.count * 1e3 if self.count else 0.0,
+            "min_ms": self.min * 1e3 if self.count else 0.0,
+            "max_ms": self.max * 1e3,
+            "histogram_us": {
+                f"<{2**k}": n for k, n in enumerate(self.buckets) if n
+            },
+        }
+        if self.nbytes:
+            report["bytes"] = self.nbytes
+            report["mb_per_s"] = self.nbytes / self.total / 1e6 if self.total else None
+        return report
+
+
+class Profiler:
+    """Thread safe recorder of command latencies and stage spans."""
+
+    enabled = True
+
+    def __init__(self, report_file: str = None):
+        self.report_file = report_file
+        self.commands: Dict[str, LatencyHistogram] = {}
+        self.stages: Dict[str, LatencyHistogram] = {}
+        self._started = time.time()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _add(table: Dict[str, LatencyHistogram], key: str, seconds: float, nbytes: int):
+        histogram = table.get(key)
+        if histogram is None:
+            histogram = table[key] = LatencyHistogram()
+        histogram.add(seconds, nbytes)
+
+    def command(self, command: str, start: float, nbytes: int = 0, batched: bool = False):
+        """
+        Record a command sent at `start` (`time.perf_counter`) and just completed.
+        `batched` messages (commands joined by `KeysightDevice.batch`) share one entry.
+        """
+        elapsed = time.perf_counter() - start
+        header = BATCH_HEADER if batched else scpi_header(command)
+        with self._lock:
+            self._add(self.commands, header, elapsed, nbytes)
+
+    def stage(self, name: str, start: float, nbytes: int = 0):
+        """Record a stage started at `start` (`time.perf_counter`) and just completed."""
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self._add(self.stages, name, elapsed, nbytes)
+
+    @contextmanager
+    def span(self, name: str):
+        """Record duration of the block as a stage."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stage(name, start)
+
+    def report(self) -> Dict:
+        """Return recorded statistics as a JSON serializable dict."""
+        with self._lock:
+            return {
+                "started": self._started,
+                "duration_s": time.time() - self._started,
+                "stages": {k: h.report() for k, h in self.stages.items()},
+                "commands": {k: h.report() for k, h in self.commands.items()},
+            }
+
+    def dump(self, file_path: str = None) -> Dict:
+        """Write report to `file_path` (or `report_file`) and return it."""
+        report = self.report()
+        file_path = file_path or self.report_file
+        if file_path:
+            with open(file_path, "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=2)
+        return report
+
+
+class NullProfiler:
+    """Profiler doing nothing, used when profiling is disabled."""
+
+    enabled = False
+
+    def command(self, command: str, start: float, nbytes: int = 0, batched: bool = False):
+        pass
+
+    def stage(self, name: str, start: float, nbytes: int = 0):
+        pass
+
+    @contextmanager
+    def span(self, name: str):
+        yield
+
+    def report(self) -> Dict:
+        return {}
+
+    def dump(self, file_path: str = None) -> Dict:
+        return {}
+
+
+NULL_PROFILER = NullProfiler()
+
+
+def profiled(stage: str):
+    """Decorator recording each call of a method as a stage of `self.profiler`."""
+
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            if not self.profiler.enabled:
+                return method(self, *args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return method(self, *args, **kwargs)
+            finally:
+                self.profiler.stage(stage, start)
+
+        return wrapper
+
+    return decorator
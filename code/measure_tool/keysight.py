@@ -4,33 +4,131 @@
 
 """
 Module for managing a Keysight oscilloscope using pyVISA.
-Supports configuration, data acquisition, and CSV export.
+Supports configuration, data acquisition (ASCII or binary transfer), and CSV export.
 """
 
+import copy
+import dataclasses
 import logging
+import math
 import os
+import json
+import threading
 import time
-import csv
+from contextlib import contextmanager
 from decimal import Decimal
+from typing import Dict, List, NamedTuple, Optional, Tuple, Union
+import numpy as np
 import pyvisa
-
-from dataclass import KeysightConfig, TimeUnit, TriggerSource
+from pyvisa.constants import EventMechanism, EventType
+
+import capture_file
+import csv_export
+from archive import CaptureArchive
+from dataclass import (
+    Capture,
+    FileFormat,
+    HORIZONTAL_DIVISIONS,
+    KeysightConfig,
+    Preamble,
+    TimeUnit,
+    TriggerSource,
+    TriggerWait,
+    Waveform,
+    WaveformFormat,
+)
+from instrumentation import NULL_PROFILER, Profiler, profiled
 
 # Constants
 MAX_CHANNELS = 4
 DEVICE_TIMEOUT = 15000  # ms
 DEFAULT_OUTPUT_DIR = "measurements"
 DEFAULT_MEAS_NAME = "measure"
+DEFAULT_STATE_FILE = ".keysight_state.json"  # Applied settings, keyed by *IDN?
+# Settings checked against the device before trusting the state file
+STATE_CHECKS = (":WAVeform:FORMat", ":TIMebase:SCALe", ":ACQuire:TYPE")
+
+# Batched commands are joined in messages up to this length (device input buffer)
+MAX_MESSAGE_LENGTH = 512  # bytes
+MAX_ERROR_READS = 32  # :SYSTem:ERRor? queue depth
+
+# Status registers bits
+ESR_OPC = 0b1  # Event status register: operation complete
+SRE_ESB = 0b100000  # Service request enable: event status bit
+OPER_RUN = 0b1000  # Operation status register: acquisition running
+
+# Returned by the device when a measurement can't be made (e.g. no edge found)
+MEASUREMENT_INVALID = 9.9e37
+
+# Trigger wait timings
+SRQ_WAIT_SLICE = 1000  # ms, keeps the wait interruptible
+POLL_MIN_INTERVAL = 0.001  # s
+POLL_MAX_INTERVAL = 0.02  # s
+POLL_BACKOFF = 1.5
+
+# Devices of a group share the state file
+_STATE_LOCK = threading.Lock()
+
+# Binary transfer data types (pyvisa struct codes), unsigned codes LSB first
+BINARY_DATATYPES = {
+    WaveformFormat.BYTE: "B",
+    WaveformFormat.WORD: "H",
+}
 
 # Set up logging
 logger = logging.getLogger(__name__)
 
 
+class KeysightError(Exception):
+    """Raised when device reports errors after a batch of commands."""
+
+
+class RawCapture(NamedTuple):
+    """Transferred, not yet parsed, acquisition."""
+
+    channels: Dict[str, Tuple[Union[str, np.ndarray], Preamble]]
+    segment_times: np.ndarray
+    timestamp: float
+
+
 class KeysightDevice:
-    def __init__(self, config: KeysightConfig):
+    def __init__(
+        self,
+        config: KeysightConfig,
+        state_file: str = DEFAULT_STATE_FILE,
+        profiler: Profiler = None,
+    ):
         self.config = config
+        self.profiler = profiler or NULL_PROFILER  # Timings, dumped at release
         self.device = None
-        self.waveforms = {}
+        self.capture = Capture()  # Last collected capture
+        self.raw = None  # Last transferred capture
+        self.trigger_time = None  # Host time of the last trigger (s since epoch)
+        self._config_snapshot = None  # Configuration applied by the last setup
+        self._pending = None  # commands waiting for flush, None when not batching
+
+        # Shadow copy of settings applied on the device: SCPI header -> argument
+        self.state_file = state_file
+        self._identity = None
+        self._state = {}
+        self._applied_hash = None
+
+    @property
+    def waveforms(self) -> Capture:
+        return self.capture
+
+    @property
+    def preambles(self) -> Dict[str, Preamble]:
+        return self.capture.preambles
+
+    @property
+    def segment_times(self) -> np.ndarray:
+        return self.capture.segment_times
+
+    @property
+    def segmented(self) -> bool:
+        """True when configured for segmented memory acquisitions."""
+        return self.config.segment_count > 1
 
     @staticmethod
     def float_to_nr3(number: float) -> str:
@@ -39,37 +137,264 @@ class KeysightDevice:
 
     def time_to_nr3(self, value: int, time_base: TimeUnit) -> str:
         """Convert time to NR3 format using a time base unit."""
-        return self.float_to_nr3(value * time_base.value / 10)
+        return self.float_to_nr3(value * time_base.value / HORIZONTAL_DIVISIONS)
+
+    @staticmethod
+    def _group_commands(commands: List[str]) -> List[List[str]]:
+        """Group commands into compound messages, each below MAX_MESSAGE_LENGTH once joined."""
+        groups = []
+        length = 0
+        for command in commands:
+            if groups and length + 1 + len(command) <= MAX_MESSAGE_LENGTH:
+                groups[-1].append(command)
+                length += 1 + len(command)
+            else:
+                groups.append([command])
+                length = len(command)
+        return groups
+
+    def _read_errors(self) -> List[str]:
+        """Drain device error queue and return reported errors."""
+        errors = []
+        for _ in range(MAX_ERROR_READS):
+            answer = self.device.query(":SYSTem:ERRor?").strip()
+            code = answer.split(",", 1)[0]
+            if int(code) == 0:
+                break
+            errors.append(answer)
+        return errors
+
+    def _flush_pending(self):
+        """Send batched commands and check device error queue once."""
+        if not self._pending:
+            return
+        commands, self._pending = self._pending, []
 
-    def _write(self, command: str):
-        """Send a command to device."""
         try:
+            for group in self._group_commands(commands):
+                message = ";".join(group)
+                start = time.perf_counter()
+                self.device.write(message)
+                self.profiler.command(message, start, batched=len(group) > 1)
+                logger.debug('Sent: "%s"', message)
+
+            errors = self._read_errors()
+            if errors:
+                raise KeysightError(
+                    f"{len(errors)} error(s) after {len(commands)} commands: "
+                    + "; ".join(errors)
+                )
+        except Exception:
+            # Settings of these commands may not be applied: send them again next time
+            for command in commands:
+                self._state.pop(command.partition(" ")[0], None)
+            raise
+
+    @contextmanager
+    def batch(self):
+        """
+        Collect commands written in the block and send them as compound messages on exit.
+        Queries inside the block flush pending commands first.
+        Raise KeysightError if device reports any error for the batch.
+        """
+        if self._pending is not None:  # Nested batch, outer one flushes
+            yield
+            return
+
+        self._pending = []
+        try:
+            yield
+            self._flush_pending()
+        except Exception:
+            # Settings of this batch may or may not have been applied
+            self._invalidate_state()
+            raise
+        finally:
+            self._pending = None
+
+    def _set(self, command: str):
+        """Send a setting command, unless device already holds this value."""
+        header, _, value = command.partition(" ")
+        if self._state.get(header) == value:
+            return
+        # Batched commands are cached when queued, dropped if their batch fails
+        if self._write(command):
+            self._state[header] = value
+
+    def _invalidate_state(self):
+        """Forget applied settings, next setup will send all of them."""
+        self._state = {}
+        self._applied_hash = None
+
+    def _load_state(self) -> bool:
+        """Restore applied settings saved for the connected device, return True if found."""
+        if not self.state_file or not os.path.exists(self.state_file):
+            return False
+        try:
+            with open(self.state_file, "r") as f:
+                entry = json.load(f).get(self._identity)
+        except Exception as e:
+            logger.warning("Ignoring unreadable state file: %s", e)
+            return False
+        if not entry:
+            return False
+
+        self._state = entry["state"]
+        self._applied_hash = entry["config_hash"]
+        return True
+
+    @staticmethod
+    def _same_setting(cached: str, answer: str) -> bool:
+        """Compare a cached setting with the device answer (numbers, or short form mnemonics)."""
+        answer = answer.strip().strip('"')
+        try:
+            return math.isclose(float(cached), float(answer), rel_tol=1e-6)
+        except ValueError:
+            short = "".join(c for c in cached if not c.islower())
+            return answer.upper() in (cached.upper(), short.upper())
+
+    def _state_matches(self) -> bool:
+        """
+        Check restored settings against the device (power cycle, *RST or front panel
+        changes since they were saved). Only STATE_CHECKS settings are queried.
+        """
+        for header in STATE_CHECKS:
+            cached = self._state.get(header)
+            if cached is None:
+                continue
+            answer = self._query(f"{header}?")
+            if not self._same_setting(cached, answer):
+                logger.warning(
+                    "Device %s is %s, not %s as saved", header, answer.strip(), cached
+                )
+                return False
+        if self._read_errors():
+            return False
+        return True
+
+    def _save_state(self):
+        """Save applied settings of the connected device."""
+        if not self.state_file or not self._identity:
+            return
+        try:
+            with _STATE_LOCK:
+                cache = {}
+                if os.path.exists(self.state_file):
+                    with open(self.state_file, "r") as f:
+                        cache = json.load(f)
+                if self._applied_hash is None:
+                    cache.pop(self._identity, None)
+                else:
+                    cache[self._identity] = {
+                        "config_hash": self._applied_hash,
+                        "state": self._state,
+                    }
+                with open(self.state_file, "w") as f:
+                    json.dump(cache, f, indent=2)
+        except Exception as e:
+            logger.warning("Failed saving state file: %s", e)
+
+    def _write(self, command: str) -> bool:
+        """Send a command to device, or queue it when batching. Return False on failure."""
+        if self._pending is not None:
+            self._pending.append(command)
+            return True
+        try:
+            start = time.perf_counter()
             self.device.write(command)
+            self.profiler.command(command, start)
             logger.debug('Sent: "%s"', command)
+            return True
         except Exception as e:
             logger.error("Write failed: %s", e)
+            return False
 
     def _query(self, command: str) -> str:
         """Send a command to device and return the answer."""
+        self._flush_pending()
         try:
+            start = time.perf_counter()
             answer = self.device.query(command)
+            self.profiler.command(command, start, len(answer))
             logger.debug('Query: "%s" -> %s', command, answer)
             return answer
         except Exception as e:
             logger.error("Query failed: %s", e)
             return ""
 
+    def _query_binary(self, command: str, datatype: str) -> np.ndarray:
+        """Send a command to device and read back an IEEE 488.2 definite-length block."""
+        self._flush_pending()
+        try:
+            start = time.perf_counter()
+            answer = self.device.query_binary_values(
+                command,
+                datatype=datatype,
+                is_big_endian=False,
+                container=np.array,
+            )
+            self.profiler.command(command, start, answer.nbytes)
+            logger.debug('Query: "%s" -> %d values', command, len(answer))
+            return answer
+        except Exception as e:
+            logger.error("Binary query failed: %s", e)
+            return np.empty(0)
+
+    @staticmethod
+    def _parse_ascii_block(raw_data: str) -> np.ndarray:
+        """Parse an ASCII waveform answer, stripping the definite-length header."""
+        if raw_data.startswith("#"):
+            header_len = int(raw_data[1])
+            raw_data = raw_data[2 + header_len :]
+        if not raw_data:
+            return np.empty(0)
+        return np.array(raw_data.split(","), dtype=np.float64)
+
+    def _setup_waveform_format(self):
+        """Select waveform transfer format."""
+        fmt = self.config.waveform_format
+        self._set(f":WAVeform:FORMat {fmt.value}")
+        if fmt != WaveformFormat.ASCII:
+            self._set(":WAVeform:UNSigned ON")
+            self._set(":WAVeform:BYTeorder LSBFirst")
+        if self.segmented:
+            # Transfer every segment in a single block
+            self._set(":WAVeform:SEGMented:ALL ON")
+
+    def _transfer_waveform(self) -> Union[str, np.ndarray]:
+        """Read waveform of the current source, as ASCII text or raw binary codes."""
+        fmt = self.config.waveform_format
+        if fmt == WaveformFormat.ASCII:
+            return self._query(":WAVeform:DATA?").strip()
+        return self._query_binary(":WAVeform:DATA?", BINARY_DATATYPES[fmt])
+
+    def _parse_waveform(
+        self, raw_data: Union[str, np.ndarray], preamble: Preamble
+    ) -> np.ndarray:
+        """Convert a transferred waveform to volts, split by segment if needed."""
+        if isinstance(raw_data, str):
+            values = self._parse_ascii_block(raw_data)
+        else:
+            values = (
+                raw_data - preamble.y_reference
+            ) * preamble.y_increment + preamble.y_origin
+
+        if self.segmented:
+            values = self._split_segments(values, preamble)
+        return values
+
     def _reset_device(self):
         """
         Reset device to it's default state.
         Ensure oscilloscope is in a known state before configuration.
         """
+        self._invalidate_state()
         self._write("*RST")
         self._write("*CLS")
         self._write(":STOP")
 
         for ch in range(1, MAX_CHANNELS + 1):
-            self._write(f":CHANnel{ch}:DISPlay OFF")
+            self._set(f":CHANnel{ch}:DISPlay OFF")
 
         logger.debug("Device reset complete.")
 
@@ -81,173 +406,527 @@ class KeysightDevice:
         scale = self.time_to_nr3(
             self.config.horizontal_range, self.config.horizontal_unit
         )
-        self._write(f":TIMebase:SCALe {scale}")
-        self._write(":TIMebase:REFerence LEFT")
-        self._write(":TIMebase:POSition 0")
+        self._set(f":TIMebase:SCALe {scale}")
+        self._set(":TIMebase:REFerence LEFT")
+        self._set(":TIMebase:POSition 0")
         logger.debug("Time base setup done.")
 
     def _setup_acquisition(self):
         """Set up acquisition mode"""
-        self._write(":ACQuire:TYPE NORMal")
+        if self.config.average_count > 1:
+            self._set(":ACQuire:TYPE AVERage")
+            self._set(f":ACQuire:COUNt {self.config.average_count}")
+        else:
+            self._set(":ACQuire:TYPE NORMal")
+        if self.segmented:
+            self._set(":ACQuire:MODE SEGMented")
+            self._set(f":ACQuire:SEGMented:COUNt {self.config.segment_count}")
+        else:
+            self._set(":ACQuire:MODE RTIMe")
         logger.debug("Acquisition setup done.")
 
     def _setup_external_channel(self):
         trig = self.config.trigger
         if trig.source == TriggerSource.EXTERNAL:
-            self._write(":EXTernal:POSition 0")
-            self._write(":EXTernal:PROBe X1")
-            self._write(f":EXTernal:RANGe {trig.threshold}{trig.threshold_unit.name}")
+            self._set(":EXTernal:POSition 0")
+            self._set(":EXTernal:PROBe X1")
+            self._set(f":EXTernal:RANGe {trig.threshold}{trig.threshold_unit.name}")
             logger.debug("External channel setup done.")
 
     def _setup_channels(self):
         """Set up channels parameters"""
+        used = {ch.number for ch in self.config.channels}
+        for number in range(1, MAX_CHANNELS + 1):
+            if number not in used:
+                self._set(f":CHANnel{number}:DISPlay OFF")
+
         for ch in self.config.channels:
-            self._write(f":CHANnel{ch.number}:COUPling DC")
-            self._write(f":CHANnel{ch.number}:UNITs VOLT")
+            self._set(f":CHANnel{ch.number}:COUPling DC")
+            self._set(f":CHANnel{ch.number}:UNITs VOLT")
 
             probe_ratio = self.float_to_nr3(ch.probe_ratio)
-            self._write(f":CHANnel{ch.number}:PROBe {probe_ratio}")
+            self._set(f":CHANnel{ch.number}:PROBe {probe_ratio}")
 
             scale_str = self.float_to_nr3(ch.vertical_scale)
-            self._write(f":CHANnel{ch.number}:SCALe {scale_str}{ch.vertical_unit.name}")
+            self._set(f":CHANnel{ch.number}:SCALe {scale_str}{ch.vertical_unit.name}")
 
             offset_str = self.float_to_nr3(ch.offset)
-            self._write(f":CHANnel{ch.number}:OFFSet {offset_str}{ch.offset_unit.name}")
+            self._set(f":CHANnel{ch.number}:OFFSet {offset_str}{ch.offset_unit.name}")
 
-            self._write(f":CHANnel{ch.number}:DISPlay ON")
-            self._write(f':CHANnel{ch.number}:LABel "{ch.name}"')
+            self._set(f":CHANnel{ch.number}:DISPlay ON")
+            self._set(f':CHANnel{ch.number}:LABel "{ch.name}"')
             logger.debug(f"Channel{ch.number} setup done.")
 
-        self._write(":DISPlay:LABel ON")
+        self._set(":DISPlay:LABel ON")
 
     def _setup_trigger(self):
         """Set up trigger parameters"""
         trig = self.config.trigger
-        self._write(":TRIGger:MODE EDGE")
-        self._write(f":TRIGger:EDGE:SOURce {trig.source.value}")
-        self._write(f":TRIGger:EDGE:SLOPe {trig.slope.value}")
-        self._write(f":TRIGger:EDGE:LEVel {self.float_to_nr3(trig.threshold)}")
+        self._set(":TRIGger:MODE EDGE")
+        self._set(f":TRIGger:EDGE:SOURce {trig.source.value}")
+        self._set(f":TRIGger:EDGE:SLOPe {trig.slope.value}")
+        self._set(f":TRIGger:EDGE:LEVel {self.float_to_nr3(trig.threshold)}")
         logger.debug("Trigger setup done.")
 
-    def _acquire_data(self):
-        """Acquire data from device by waiting for trigger event to be detected."""
-        try:
-            self._write(":WAVeform:FORMat ASCII")
-            self._write(":WAVeform:POINts:MODE MAXimum")
+    def _setup_measurements(self):
+        """Install configured measurements, evaluated on every acquisition."""
+        if not self.config.measurements:
+            return
+        self._write(":MEASure:CLEar")
+        for m in self.config.measurements:
+            self._write(f":MEASure:{m.type.value} {m.sources}")
+        logger.debug("Measurements setup done.")
 
-            # Calculate the number of points based on the horizontal scale and required frequency
-            time_range = (
-                10 * self.config.horizontal_range * self.config.horizontal_unit.value
-            )
-            freq = self.config.frequency * self.config.frequency_unit.value
-            num_points = int(time_range * freq)
-            self._write(f":WAVeform:POINts {num_points}")
+    def _arm(self) -> TriggerWait:
+        """
+        Arm a single acquisition and return the wait strategy actually used.
+        Falls back on polling if service requests are not supported by the link.
+        """
+        if self.config.trigger_wait == TriggerWait.SRQ:
+            try:
+                with self.batch():
+                    self._write("*CLS")
+                    self._write(f"*ESE {ESR_OPC}")
+                    self._write(f"*SRE {SRE_ESB}")
+                self.device.enable_event(EventType.service_request, EventMechanism.queue)
+                # OPC is only set once the digitize operation is complete
+                self._write(":DIGitize;*OPC")
+                return TriggerWait.SRQ
+            except Exception as e:
+                logger.warning("Service request unavailable (%s), polling instead", e)
+                self._write("*SRE 0")
+
+        self._query(":SINGle;*OPC?")
+        return TriggerWait.POLL
+
+    def _srq_received(self, timeout_ms: int) -> bool:
+        """Wait up to `timeout_ms` for a service request, True if acquisition is complete."""
+        response = self.device.wait_on_event(
+            EventType.service_request, timeout_ms, capture_timeout=True
+        )
+        if response.timed_out:
+            return False
+        self.device.read_stb()
+        return bool(int(self._query("*ESR?")) & ESR_OPC)
 
-            logger.info("Waiting for trigger")
+    def _disable_srq(self):
+        self.device.disable_event(EventType.service_request, EventMechanism.queue)
+        self._write("*SRE 0")
 
-            self._query("*OPC?")
-            self._write(":SINGLE")
+    def _acquisition_running(self) -> bool:
+        return bool(int(self._query(":OPERegister:CONDition?")) & OPER_RUN)
 
+    def _wait_srq(self, deadline: float) -> bool:
+        """Wait for the operation complete service request."""
+        try:
             while True:
-                cond = int(self._query(":OPERegister:CONDition?"))
-                if (cond & 0b1000) == 0:
-                    break
-                time.sleep(0.001)
+                slice_ms = SRQ_WAIT_SLICE
+                if deadline is not None:
+                    remaining_ms = int((deadline - time.monotonic()) * 1000)
+                    if remaining_ms <= 0:
+                        return False
+                    slice_ms = min(slice_ms, remaining_ms)
+
+                if self.poll_trigger(TriggerWait.SRQ, slice_ms):
+                    return True
+        finally:
+            self.end_wait(TriggerWait.SRQ)
+
+    def _wait_poll(self, deadline: float) -> bool:
+        """Poll operation status register until acquisition stops running."""
+        interval = POLL_MIN_INTERVAL
+        while not self.poll_trigger(TriggerWait.POLL):
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(interval)
+            interval = min(interval * POLL_BACKOFF, POLL_MAX_INTERVAL)
+        return True
+
+    def _wait_for_trigger(self, strategy: TriggerWait) -> bool:
+        """Wait for the armed acquisition to complete, within configured timeout."""
+        deadline = None
+        if self.config.trigger_timeout is not None:
+            deadline = time.monotonic() + self.config.trigger_timeout
+
+        if strategy == TriggerWait.SRQ:
+            done = self._wait_srq(deadline)
+        else:
+            done = self._wait_poll(deadline)
+
+        if not done:
+            self.stop()
+            logger.error("No trigger within %s s", self.config.trigger_timeout)
+        return done
+
+    def _read_segment_times(self) -> np.ndarray:
+        """Read trigger time tag of each segment, relative to the first one."""
+        answer = self._query(":WAVeform:SEGMented:XLISt? TTAG").strip()
+        if not answer:
+            return np.empty(0)
+        return np.array(answer.split(","), dtype=np.float64)
+
+    def _split_segments(self, values: np.ndarray, preamble: Preamble) -> np.ndarray:
+        """Reshape a block holding all segments into a (segments, points) array."""
+        if preamble.points <= 0 or values.size % preamble.points:
+            raise ValueError(
+                f"{values.size} points can't be split in segments of {preamble.points}"
+            )
+        return values.reshape(-1, preamble.points)
 
-            logger.info("Trigger detected")
-        except Exception as e:
-            logger.error("Acquisition error: %s", e)
+    def _prepare_acquisition(self):
+        """Set up waveform transfer of the next acquisition."""
+        with self.batch():
+            self._setup_waveform_format()
+            self._set(":WAVeform:POINts:MODE MAXimum")
+
+            # Number of points is clamped to an allowed value (see `KeysightConfig`)
+            self._set(f":WAVeform:POINts {self.config.waveform_points}")
 
-    def connect(self, address: str = None):
-        """Connect using the provided VISA address."""
+    def _acquire_data(self) -> bool:
+        """
+        Acquire data from device by waiting for trigger event to be detected.
+        Return True once data is ready to be read.
+        """
+        strategy = self.arm()
+        return strategy is not None and self.wait(strategy)
+
+    def connect(
+        self,
+        address: str = None,
+        force_reset: bool = False,
+        resource_manager: pyvisa.ResourceManager = None,
+    ):
+        """
+        Connect using the provided VISA address.
+        Device reset is skipped when its applied settings are known from the state
+        file and key settings (STATE_CHECKS) still match the device, unless
+        `force_reset` is set.
+        A resource manager can be provided, e.g. `simulator.SimulatedResourceManager`.
+        """
         logger.info("Connecting to target device...")
         try:
-            rm = pyvisa.ResourceManager()
+            rm = resource_manager or pyvisa.ResourceManager()
             if address:
                 self.device = rm.open_resource(address)
             else:
                 self.device = rm.open_resource(rm.list_resources()[0])
             self.device.timeout = DEVICE_TIMEOUT
+            self._identity = self._query("*IDN?").strip()
 
-            self._reset_device()
+            if not force_reset and self._load_state() and self._state_matches():
+                logger.info("Device state restored, skipping reset")
+            else:
+                with self.batch():
+                    self._reset_device()
+                self._save_state()
             logger.info('Connected to "%s"', address)
         except Exception as e:
             logger.error("Connection failed: %s", e)
 
+    @profiled("setup")
     def setup(self):
-        """Set up the device with provided configuration."""
+        """
+        Set up the device with provided configuration.
+        Only settings that differ from the applied ones are sent.
+        """
         try:
+            config_hash = self.config.digest()
+            # Captures keep the configuration they were acquired with
+            self._config_snapshot = copy.deepcopy(self.config)
+            if config_hash == self._applied_hash:
+                logger.info("Device already set up with this configuration")
+                return
+
             logger.info("Running setup")
-            self._setup_acquisition()
-            self._setup_time_base()
-            self._setup_external_channel()
-            self._setup_channels()
-            self._setup_trigger()
+            try:
+                with self.batch():
+                    self._setup_acquisition()
+                    self._setup_time_base()
+                    self._setup_external_channel()
+                    self._setup_channels()
+                    self._setup_trigger()
+                    self._setup_measurements()
+            except KeysightError:
+                self._save_state()  # Drop invalidated state
+                raise
+
+            self._applied_hash = config_hash
+            self._save_state()
             logger.info("Device setup done")
         except KeyboardInterrupt:
             self.release()
 
-    def collect(self):
+    @profiled("arm")
+    def arm(self) -> Union[TriggerWait, None]:
+        """
+        Arm a single acquisition without waiting for it.
+        Return the wait strategy to pass to `wait`, or None on failure.
+        """
+        self.trigger_time = None
+        try:
+            self._prepare_acquisition()
+            logger.info("Waiting for trigger")
+            return self._arm()
+        except Exception as e:
+            logger.error("Acquisition error: %s", e)
+            return None
+
+    def poll_trigger(self, strategy: TriggerWait, timeout_ms: int = 0) -> bool:
+        """
+        Single step of a trigger wait: return True if the armed acquisition is
+        complete. Service requests are waited for up to `timeout_ms`, status polls
+        return at once. Lets callers schedule their own waits (e.g. asyncio).
+        """
+        if strategy == TriggerWait.SRQ:
+            return self._srq_received(timeout_ms)
+        return not self._acquisition_running()
+
+    def end_wait(self, strategy: TriggerWait):
+        """Release what a trigger wait holds (service request events), once done or abandoned."""
+        if strategy == TriggerWait.SRQ:
+            self._disable_srq()
+
+    def stop(self):
+        """Stop the running acquisition, e.g. after a trigger wait timed out."""
+        self._write(":STOP")
+
+    @profiled("wait")
+    def wait(self, strategy: TriggerWait) -> bool:
+        """Wait for an armed acquisition to complete, return True once data is ready."""
+        try:
+            if not self._wait_for_trigger(strategy):
+                return False
+            self.trigger_time = time.time()
+            logger.info("Trigger detected")
+            return True
+        except Exception as e:
+            logger.error("Acquisition error: %s", e)
+            return False
+
+    def acquire(self) -> bool:
+        """Arm the device and wait for the acquisition to complete."""
+        return self._acquire_data()
+
+    @profiled("read_measurements")
+    def read_measurements(self) -> Dict[str, float]:
+        """
+        Read values of configured measurements on the last acquisition, in a single
+        compound query. Measurements the device could not make are NaN.
+        """
+        query = ";".join(
+            f":MEASure:{m.type.value}? {m.sources}" for m in self.config.measurements
+        )
+        answer = self._query(query).strip()
+        values = answer.split(";") if answer else []
+        if len(values) != len(self.config.measurements):
+            logger.error("Unexpected measurements answer: '%s'", answer)
+            return {m.name: np.nan for m in self.config.measurements}
+
+        results = {}
+        for m, value in zip(self.config.measurements, values):
+            try:
+                number = float(value)
+            except ValueError:
+                number = np.nan
+            results[m.name] = np.nan if abs(number) >= MEASUREMENT_INVALID else number
+        return results
+
+    def measure(self) -> Dict[str, float]:
+        """
+        Acquire a single shot and return configured measurements, without transferring
+        waveforms. Return an empty dict if acquisition failed.
+        """
+        if not self.config.measurements:
+            logger.error("No measurement configured")
+            return {}
+        if not self.acquire():
+            logger.error("Acquisition failed, no measurement retrieved")
+            return {}
+        return self.read_measurements()
+
+    def transfer(self) -> RawCapture:
+        """
+        Transfer last acquisition from device without parsing it.
+        Only this step and `acquire` require access to the instrument.
+        """
+        start = time.perf_counter()
+        channels = {}
+        for ch in self.config.channels:
+            logger.info(f'Capturing data from Channel {ch.number} ("{ch.name}")')
+            self._write(f":WAVeform:SOURce CHANnel{ch.number}")
+            try:
+                preamble = Preamble.from_query(self._query(":WAVeform:PREamble?"))
+                channels[ch.name] = (self._transfer_waveform(), preamble)
+            except Exception as e:
+                logger.error(f"Failed reading data for {ch.name}: {e}")
+
+        segment_times = np.empty(0)
+        if self.segmented:
+            segment_times = self._read_segment_times()
+
+        nbytes = sum(
+            len(data) if isinstance(data, str) else data.nbytes
+            for data, _ in channels.values()
+        )
+        self.profiler.stage("transfer", start, nbytes)
+        return RawCapture(channels, segment_times, self.trigger_time or time.time())
+
+    @profiled("parse")
+    def parse(self, raw: RawCapture) -> Capture:
+        """Convert a transferred capture into waveforms in volts, keyed by channel name."""
+        waveforms = {}
+        for ch in self.config.channels:
+            raw_data, preamble = raw.channels.get(ch.name, (None, None))
+            try:
+                values = self._parse_waveform(raw_data, preamble)
+                logger.info(f"{ch.name}: {values.size} points collected")
+            except Exception as e:
+                logger.error(f"Failed parsing data for {ch.name}: {e}")
+                values = np.empty(0)
+            waveforms[ch.name] = Waveform(ch.name, values, preamble, raw.segment_times)
+        return Capture(waveforms, raw.segment_times, raw.timestamp, self._config_snapshot)
+
+    def fetch(self) -> Capture:
+        """Transfer and parse the last acquisition, keeping it as the current capture."""
+        raw = self.transfer()
+        self.raw = raw
+        self.capture = self.parse(raw)
+        if self.segmented:
+            logger.info(f"{len(self.segment_times)} segments collected")
+
+        logger.info("Data retrieval done")
+        return self.capture
+
+    def clear_capture(self):
+        """Forget the current capture."""
+        self.capture = Capture()
+        self.raw = None
+
+    def collect(self) -> Capture:
         """Collect data"""
         try:
-            self._acquire_data()
-            for ch in self.config.channels:
-                logger.info(f'Capturing data from Channel {ch.number} ("{ch.name}")')
-                self._write(f":WAVeform:SOURce CHANnel{ch.number}")
-                raw_data = self._query(":WAVeform:DATA?").strip()
-
-                try:
-                    values = [float(v) for v in raw_data.split(",")[1:]]
-                    self.waveforms[ch.name] = values
-                    logger.info(f"{ch.name}: {len(values)} points collected")
-                except Exception as e:
-                    logger.error(f"Failed parsing data for {ch.name}: {e}")
-                    self.waveforms[ch.name] = []
-
-            logger.info("Data retrieval done")
+            self.clear_capture()
+            if not self.acquire():
+                logger.error("Acquisition failed, no data retrieved")
+                return self.capture
+            self.fetch()
         except KeyboardInterrupt:
             self.release()
+        return self.capture
+
+    @staticmethod
+    def _output_path(folder: str, name: str, file_format: FileFormat) -> Tuple[str, str]:
+        """Return file name and path for a measure name, creating folder if needed."""
+        os.makedirs(folder, exist_ok=True)
+        safe_name = name.lower().replace(" ", "_").split(".", 1)[0] + file_format.value
+        return safe_name, os.path.join(folder, safe_name)
+
+    def _raw_channels(self, raw: RawCapture) -> Dict[str, Tuple[np.ndarray, Preamble]]:
+        """
+        Return raw codes and preamble of each channel, split by segment if segmented.
+        ASCII transfers hold no raw codes, their values are returned as float.
+        """
+        channels = {}
+        for ch_name, (raw_data, preamble) in raw.channels.items():
+            if isinstance(raw_data, str):
+                raw_data = self._parse_ascii_block(raw_data)
+                preamble = dataclasses.replace(
+                    preamble, y_increment=1.0, y_origin=0.0, y_reference=0.0
+                )
+            if self.segmented:
+                raw_data = self._split_segments(raw_data, preamble)
+            channels[ch_name] = (raw_data, preamble)
+        return channels
+
+    @profiled("save")
+    def save_capture(self, folder: str, name: str, raw: RawCapture = None) -> str:
+        """
+        Save raw codes and scaling of a capture to a binary file (see `capture_file.py`).
+        ASCII transfers hold no raw codes, their values are saved as float.
+        Last collected capture is saved unless `raw` is given.
+        """
+        raw = raw or self.raw
+        if raw is None or not raw.channels:
+            logger.error("No data to save")
+            return ""
+
+        logger.info("Saving captured data...")
+        safe_name, file_path = self._output_path(folder, name, FileFormat.BINARY)
+        capture_file.write_capture(
+            file_path, self._raw_channels(raw), raw.segment_times, self.config, raw.timestamp
+        )
+        logger.info("Data saved to: %s", file_path)
+        return safe_name
+
+    @profiled("save")
+    def archive_capture(
+        self, archive: CaptureArchive, name: str, raw: RawCapture = None
+    ) -> Optional[int]:
+        """
+        Append raw codes of a capture to an archive, tagged with the measure name.
+        Last collected capture is archived unless `raw` is given.
+        Return the capture id, or None if there is nothing to archive.
+        """
+        raw = raw or self.raw
+        if raw is None or not raw.channels:
+            logger.error("No data to save")
+            return None
+
+        capture_id = archive.append(
+            self._raw_channels(raw),
+            raw.timestamp,
+            self.config,
+            raw.segment_times,
+            tags=[name],
+        )
+        logger.info("Capture %d appended to: %s", capture_id, archive.path)
+        return capture_id
 
-    def save_measures(self, folder: str, name: str) -> str:
+    @profiled("save")
+    def save_measures(self, folder: str, name: str, capture: Capture = None) -> str:
         """
         Save collected data to a CSV file.
 
         The file is named based on the provided name and saved in the specified folder.
         Folder is created if it does not exist.
+        Timestamps are the capture time axis (preamble sample interval and origin).
+        Segmented captures are written back to back, each segment being offset
+        by its trigger time tag.
+        Last collected capture is saved unless `capture` is given.
         """
-        logger.info("Saving captured data...")
-        os.makedirs(folder, exist_ok=True)
+        capture = self.capture if capture is None else capture
 
-        safe_name = name.lower().replace(" ", "_").split(".", 1)[0] + ".csv"
-        file_path = os.path.join(folder, safe_name)
+        names = [ch.name for ch in self.config.channels]
+        arrays = [np.atleast_2d(capture.get(n, np.empty(0))) for n in names]
+        points = min(a.shape[-1] for a in arrays)
+        if points == 0:
+            logger.error("No data to save")
+            return ""
 
-        with open(file_path, "w", newline="") as f:
-            writer = csv.writer(f)
-            header = ["Timestamp"] + [ch.name for ch in self.config.channels]
-            writer.writerow(header)
+        logger.info("Saving captured data...")
+        safe_name, file_path = self._output_path(folder, name, FileFormat.CSV)
 
-            min_len = min(len(data) for data in self.waveforms.values())
-            if min_len == 0:
-                logger.error("No data to save")
-                return ""
+        first = capture.waveform(names[0])
+        if first.preamble is None:
+            logger.warning("No preamble, sample interval derived from configuration")
+            x_increment = self.config.time_range / points
+            preamble = Preamble(0, 0, points, 1, x_increment, 0.0, 0, 1.0, 0.0, 0)
+            first = Waveform(first.name, first.values, preamble, first.segment_times)
+
+        timestamps = np.atleast_2d(first.time)[:, :points].ravel()
+        columns = [a[:, :points].ravel() for a in arrays]
+        csv_export.write_csv(file_path, names, timestamps, columns)
 
-            sampling_duration = (
-                self.config.horizontal_range * self.config.horizontal_unit.value
-            )
-            time_increment = sampling_duration / min_len
-
-            for i in range(min_len - 1):
-                time_stamp = i * time_increment
-                row = [time_stamp] + [
-                    self.waveforms[ch.name][i] for ch in self.config.channels
-                ]
-                writer.writerow(row)
         logger.info("Data saved to: %s", file_path)
         return safe_name
 
     def release(self):
         """Release the device connection."""
         logger.info("Releasing device connection")
+        self._save_state()
+        if self.profiler.enabled and self.profiler.report_file:
+            self.profiler.dump()
+            logger.info("Timings saved to: %s", self.profiler.report_file)
         if self.device:
             self.device.close()
             logger.info("Device released")
@@ -0,0 +1,265 @@
+"""
+Live view of captures while a campaign runs.
+
+Captures are pushed by the acquisition loop (or as a campaign handler) into a
+small drop-oldest buffer: pushing never blocks nor copies, captures arriving
+faster than the display are skipped. A render thread decimates the newest ones
+at most `fps` times per second and keeps the last `history` traces of each
+channel, older ones faded.
+
+Traces are updated in place, the figure being built once: on a Plotly
+`FigureWidget` (notebooks, requires `anywidget`) or on a local Dash page,
+which only sends new trace data to the browser.
+"""
+
+import logging
+import sys
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import plotly.graph_objects as go
+from plotly.subplots import make_subplots
+
+from dataclass import Capture
+from decimation import DecimationMethod, decimate
+from plotter import DEFAULT_DASH_PORT, DEFAULT_POINT_BUDGET
+
+DEFAULT_HISTORY = 5  # Traces kept on screen per channel
+DEFAULT_FPS = 10  # Redraws per second, at most
+TRACE_COLORS = ["black", "orangered", "teal", "mediumpurple", "firebrick", "olive"]
+
+logger = logging.getLogger(__name__)
+
+# Channel name -> (timestamps, values) of the newest traces, newest first
+Frame = Dict[str, List[Tuple[np.ndarray, np.ndarray]]]
+
+
+class LiveView:
+    """
+    Live display of the last captures of `channels`. Time axes come from the
+    preambles of pushed `Capture`s, else from `x_increment` (s, sample index if None).
+    Call `start` (or `serve`) before pushing captures, `stop` once done.
+    """
+
+    def __init__(
+        self,
+        channels: List[str],
+        x_increment: Optional[float] = None,
+        history: int = DEFAULT_HISTORY,
+        max_points: int = DEFAULT_POINT_BUDGET,
+        fps: float = DEFAULT_FPS,
+        method: DecimationMethod = DecimationMethod.MINMAX,
+    ):
+        if history < 1 or fps <= 0:
+            raise ValueError("History and frame rate must be positive.")
+        self.channels = list(channels)
+        self.x_increment = x_increment
+        self.history = history
+        self.max_points = max_points
+        self.interval = 1 / fps
+        self.method = method
+        self.dropped = 0  # Captures replaced before being displayed
+
+        self._pending = deque(maxlen=history)  # (waveforms, x_origin, x_increment), drop-oldest
+        self._traces = {name: deque(maxlen=history) for name in self.channels}
+        self._frame = 0  # Rendered frames count, tells clients something changed
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._widget = None
+
+    def push(self, waveforms: Dict[str, np.ndarray], x_origin: float = None) -> None:
+        """
+        Queue a capture for display, without copying it: arrays must not be modified
+        afterwards (`KeysightDevice.collect` returns new ones for every capture).
+        Time origin and sample interval are the preamble ones of a `Capture`, else
+        `x_origin` (default 0) and the view `x_increment`.
+        """
+        preambles = waveforms.preambles if isinstance(waveforms, Capture) else {}
+        first = next(iter(preambles.values()), None)
+        if x_origin is None:
+            x_origin = first.x_origin if first else 0.0
+        x_increment = first.x_increment if first else self.x_increment or 1.0
+        with self._lock:
+            if len(self._pending) == self._pending.maxlen:
+                self.dropped += 1
+            self._pending.append((waveforms, x_origin, x_increment))
+        self._wakeup.set()
+
+    def handler(self, _name: str, waveforms: Dict[str, np.ndarray]) -> None:
+        """Campaign capture handler (see `campaign.CaptureHandler`)."""
+        self.push(waveforms)
+
+    def _decimate(
+        self, values: np.ndarray, x_origin: float, x_increment: float
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        x = x_origin + np.arange(len(values)) * x_increment
+        return decimate(x, values, self.max_points, self.method)
+
+    def _render(self) -> bool:
+        """Decimate pending captures into displayed traces, True if any."""
+        with self._lock:
+            pending = list(self._pending)
+            self._pending.clear()
+        if not pending:
+            return False
+
+        for waveforms, x_origin, x_increment in pending:
+            for name in self.channels:
+                values = waveforms.get(name)
+                if values is None or not np.size(values):
+                    continue
+                # Segmented captures: each segment is shown as a trace
+                for row in np.atleast_2d(values)[-self.history :]:
+                    trace = self._decimate(row, x_origin, x_increment)
+                    with self._lock:
+                        self._traces[name].appendleft(trace)
+        with self._lock:
+            self._frame += 1
+        return True
+
+    def _run(self):
+        next_frame = 0.0
+        while not self._stop.is_set():
+            self._wakeup.wait(timeout=self.interval)
+            self._wakeup.clear()
+            # Throttle: captures arriving until the next frame are merged into it
+            delay = next_frame - time.monotonic()
+            if delay > 0 and self._stop.wait(delay):
+                break
+            if self._render():
+                next_frame = time.monotonic() + self.interval
+                if self._widget is not None:
+                    self._update_figure(self._widget)
+        logger.debug("Live view stopped, %d captures dropped", self.dropped)
+
+    def start(self):
+        """Start the render thread."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="live_view", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the render thread, traces stay displayed."""
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def frame(self) -> Tuple[int, Frame]:
+        """Return the number of rendered frames and the newest traces of each channel."""
+        with self._lock:
+            return self._frame, {name: list(t) for name, t in self._traces.items()}
+
+    def _slots(self):
+        """Yield (trace index, channel, age) of every trace of the figure."""
+        for row, name in enumerate(self.channels):
+            for age in range(self.history):
+                yield row * self.history + age, name, age
+
+    def figure(self) -> go.Figure:
+        """Build the figure, one subplot per channel and a trace per displayed capture."""
+        fig = make_subplots(
+            rows=len(self.channels),
+            cols=1,
+            shared_xaxes=True,
+            subplot_titles=self.channels,
+            vertical_spacing=0.06,
+        )
+        for index, name, age in self._slots():
+            row = index // self.history
+            fig.add_trace(
+                go.Scattergl(
+                    x=[],
+                    y=[],
+                    name=f"{name} -{age}" if age else name,
+                    line=dict(color=TRACE_COLORS[row % len(TRACE_COLORS)]),
+                    opacity=1.0 - 0.8 * age / self.history,
+                    showlegend=False,
+                ),
+                row=row + 1,
+                col=1,
+            )
+        fig.update_layout(
+            margin=dict(l=30, r=30),
+            template="ggplot2",
+            height=250 * len(self.channels),
+            title_text="Live view",
+            uirevision="live",  # Keep user zoom across updates
+        )
+        return fig
+
+    def _update_figure(self, fig: go.Figure):
+        _, traces = self.frame()
+        with fig.batch_update():
+            for index, name, age in self._slots():
+                x, y = traces[name][age] if age < len(traces[name]) else ([], [])
+                fig.data[index].x = x
+                fig.data[index].y = y
+
+    def figure_widget(self) -> Optional[go.FigureWidget]:
+        """
+        Return a `FigureWidget` updated in place by the render thread (for notebooks,
+        requires the optional `anywidget` package), and start the render thread.
+        """
+        try:
+            widget = go.FigureWidget(self.figure())
+        except ImportError:
+            logger.error("Figure widgets require anywidget: pip install anywidget")
+            return None
+        self._widget = widget
+        self.start()
+        return widget
+
+    def serve(self, port: int = DEFAULT_DASH_PORT) -> None:
+        """
+        Serve the live view on a local Dash page (requires the optional `dash`
+        package), polled at the view frame rate. Blocks, run acquisition in another thread.
+        """
+        try:
+            # pylint: disable = import-outside-toplevel
+            from dash import Dash, Input, Output, Patch, State, dcc, html
+            from dash.exceptions import PreventUpdate
+        except ImportError:
+            logger.error("Live view requires dash: pip install dash")
+            sys.exit(-1)
+
+        app = Dash(__name__)
+        app.layout = html.Div(
+            [
+                dcc.Graph(id="graph", figure=self.figure(), style={"height": "95vh"}),
+                dcc.Interval(id="tick", interval=int(self.interval * 1000)),
+                dcc.Store(id="frame", data=0),
+            ]
+        )
+
+        @app.callback(
+            Output("graph", "figure"),
+            Output("frame", "data"),
+            Input("tick", "n_intervals"),
+            State("frame", "data"),
+        )
+        def _on_tick(_, shown):
+            frame, traces = self.frame()
+            if frame == shown:
+                raise PreventUpdate
+            # Only trace data is sent, layout and zoom stay untouched
+            patch = Patch()
+            for index, name, age in self._slots():
+                x, y = traces[name][age] if age < len(traces[name]) else ([], [])
+                patch["data"][index]["x"] = x
+                patch["data"][index]["y"] = y
+            return patch, frame
+
+        self.start()
+        logger.info("Serving live view on http://127.0.0.1:%d", port)
+        try:
+            app.run(port=port, debug=False)
+        finally:
+            self.stop()
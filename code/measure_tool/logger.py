@@ -1,4 +1,9 @@
+import atexit
 import logging
+import queue
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener
 
 
 class CustomFormatter(logging.Formatter):
@@ -36,9 +41,97 @@ class CustomFormatter(logging.Formatter):
         logging.CRITICAL: MAGENTA,
     }
 
-    def format(self, record):
-        color = self.LEVEL_COLORS.get(record.levelno, self.GREY)
-        template = self.LEVEL_FORMATS.get(record.levelno, self.RAW_LOGS)
+    def __init__(self):
+        super().__init__()
+        # Formatters are built once per level, not for every record
+        self._formatters = {
+            level: self._make_formatter(level) for level in self.LEVEL_FORMATS
+        }
+
+    def _make_formatter(self, level: int) -> logging.Formatter:
+        color = self.LEVEL_COLORS.get(level, self.GREY)
+        template = self.LEVEL_FORMATS.get(level, self.RAW_LOGS)
         format_string = template.format(level_color=color, reset=self.RESET)
-        formatter = logging.Formatter(format_string, datefmt="%H:%M:%S")
+        return logging.Formatter(format_string, datefmt="%H:%M:%S")
+
+    def format(self, record):
+        formatter = self._formatters.get(record.levelno)
+        if formatter is None:  # Custom level
+            formatter = self._formatters[record.levelno] = self._make_formatter(
+                record.levelno
+            )
+        dropped = getattr(record, "dropped", 0)
+        if dropped:
+            # Record is shared with other handlers, message is changed on a copy
+            record = logging.makeLogRecord(record.__dict__)
+            record.msg = f"{record.msg} ({dropped} similar messages dropped)"
         return formatter.format(record)
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Let at most `rate` records per second through for each message template and
+    first argument (e.g. the SCPI command of trigger poll queries), records at
+    `max_level` or above always pass.
+    The number of dropped records is set as `dropped` on the next accepted one
+    (shown by `CustomFormatter`).
+    """
+
+    def __init__(self, rate: float = 10, max_level: int = logging.INFO):
+        super().__init__()
+        self.interval = 1 / rate
+        self.max_level = max_level
+        self._next = {}  # (logger name, template, argument) -> next accepted time
+        self._dropped = {}
+        self._lock = threading.Lock()  # Records are filtered in the logging threads
+
+    def filter(self, record):
+        if record.levelno >= self.max_level:
+            return True
+
+        # Only the first word of the argument: SCPI headers, not their values
+        args = record.args if isinstance(record.args, tuple) else ()
+        argument = str(args[0]).partition(" ")[0] if args else None
+        key = (record.name, record.msg, argument)
+        now = time.monotonic()
+        with self._lock:
+            if now < self._next.get(key, 0.0):
+                self._dropped[key] = self._dropped.get(key, 0) + 1
+                return False
+            self._next[key] = now + self.interval
+            dropped = self._dropped.pop(key, 0)
+        if dropped:
+            record.dropped = dropped
+        return True
+
+
+class _ThreadQueueHandler(QueueHandler):
+    """Queue handler leaving formatting to the listener thread."""
+
+    def prepare(self, record):
+        # Records stay in process, no need to format them for pickling
+        return record
+
+
+def setup_logging(
+    level: int = logging.INFO, rate_limit: float = None
+) -> QueueListener:
+    """
+    Log to console through a queue: the calling threads only enqueue records,
+    formatting and console output happen in a listener thread.
+    Debug records repeated faster than `rate_limit` per second are dropped, if set.
+    The listener is stopped (and the queue flushed) at exit.
+    """
+    log_queue = queue.SimpleQueue()
+    queue_handler = _ThreadQueueHandler(log_queue)
+    if rate_limit:
+        queue_handler.addFilter(RateLimitFilter(rate_limit))
+
+    console = logging.StreamHandler()
+    console.setFormatter(CustomFormatter())
+    listener = QueueListener(log_queue, console, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+
+    logging.basicConfig(level=level, handlers=[queue_handler], force=True)
+    return listener
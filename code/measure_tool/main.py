@@ -1,11 +1,14 @@
 # pylint: disable = missing-module-docstring, missing-function-docstring
 
 import logging
-import time
-from logger import CustomFormatter
+import os
+from logger import setup_logging
 
 import keysight as ks
+from analysis import delay_handler
+from campaign import CampaignRunner
 from plotter import plot_collected_data
+from wind import WindEstimator
 
 from dataclass import (
     KeysightConfig,
@@ -16,6 +19,7 @@ from dataclass import (
     SlopeType,
     VoltageUnit,
     FrequencyUnit,
+    WaveformFormat,
 )
 
 # Create the logger
@@ -23,9 +27,10 @@ from dataclass import (
 # "logger = logging.getLogger(__name__)"
 # at the top of your dependency to use the same shared logger instance (shared format)
 logger = logging.getLogger(__name__)
-handler = logging.StreamHandler()
-handler.setFormatter(CustomFormatter())
-logging.basicConfig(level=logging.INFO, handlers={handler})
+# Records are formatted and printed by a background thread, off the instrument one.
+# Debug records repeated faster than this (e.g. trigger polling) are dropped.
+LOG_RATE_LIMIT = 20  # records/s
+setup_logging(logging.INFO, rate_limit=LOG_RATE_LIMIT)
 
 channel1 = Channel(
     number=1,
@@ -65,6 +70,7 @@ keysight_config = KeysightConfig(
     frequency_unit=FrequencyUnit.MHz,
     horizontal_range=2,
     horizontal_unit=TimeUnit.MS,
+    waveform_format=WaveformFormat.BYTE,
 )
 
 MEASURES_NAME = [
@@ -81,13 +87,25 @@ def main():
     device.connect()
     device.setup()
 
-    for name in MEASURES_NAME:
-        time.sleep(4)  # Wait for the device to be ready
-        # input(f'Press enter to run next test, named: \n "{name}".')
-
-        device.collect()
-        f = device.save_measures(OUTPUT_DIR, name)
-        output_files.append(f)
+    # Captures are saved by background writers while the next one is armed
+    # Emitter to receivers delays are logged for each capture
+    # Receiver offsets are calibrated on the first measure, taken without wind
+    wind = WindEstimator()
+    runner = CampaignRunner(
+        device, OUTPUT_DIR, handlers=[delay_handler(), wind.calibration_handler]
+    )
+    output_files.extend(runner.run(MEASURES_NAME[:1]))
+    if wind.calibrated:
+        logger.info("Receiver offsets: %.3f us, %.3f us", *(o * 1e6 for o in wind.offsets))
+        runner.handlers = [delay_handler(), wind.handler]
+    else:
+        logger.error("Wind calibration failed, wind is not estimated")
+        runner.handlers = [delay_handler()]
+    output_files.extend(runner.run(MEASURES_NAME[1:]))
+
+    if wind.smoothed:
+        logger.info("Wind: %.2f m/s toward %.0f deg", *wind.smoothed)
+        wind.save_series(os.path.join(OUTPUT_DIR, "wind.csv"))
 
     device.release()
 
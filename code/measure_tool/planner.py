@@ -0,0 +1,210 @@
+"""
+Acquisition planner.
+
+Estimates what a `KeysightConfig` costs before running it: effective point count
+and sample rate, bytes and time to transfer a capture, host memory, file sizes
+and achievable captures per second. `fit_to_budget` picks the largest point count
+and best transfer format meeting a shot rate or memory target.
+
+Link rate and command latency default to typical USB values, measure yours with
+`benchmark.py` or `instrumentation.Profiler` and pass them for accurate plans.
+
+Usage:
+    python planner.py [--points 100000] [--link-rate 8] [--shot-rate 5]
+"""
+
+import argparse
+import dataclasses
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from dataclass import (
+    ALLOWED_WAVEFORM_POINTS,
+    HORIZONTAL_DIVISIONS,
+    FileFormat,
+    KeysightConfig,
+    WaveformFormat,
+)
+from presets import make_config
+
+DEFAULT_LINK_RATE = 8e6  # bytes/s, USB 2.0 TMC
+DEFAULT_COMMAND_LATENCY = 1e-3  # s, single query round trip
+
+# Transferred bytes per sample (ASCII: "+1.234567E-01," NR3 values)
+TRANSFER_BYTES = {
+    WaveformFormat.ASCII: 14,
+    WaveformFormat.BYTE: 1,
+    WaveformFormat.WORD: 2,
+}
+PARSED_BYTES = 8  # float64 volts per sample on host
+# Stored bytes per sample of capture files: raw codes, ASCII values as float64
+STORED_BYTES = {
+    WaveformFormat.ASCII: PARSED_BYTES,
+    WaveformFormat.BYTE: 1,
+    WaveformFormat.WORD: 2,
+}
+CSV_TIMESTAMP_BYTES = 17  # "0.000123456789012," (see csv_export.TIME_DECIMALS)
+CSV_VALUE_BYTES = 11  # "-0.0123456," (see csv_export.VALUE_DECIMALS)
+BINARY_HEADER_BYTES = 4096  # JSON header of capture files, configuration included
+
+# Queries per capture: arm, status, and source/preamble/data per channel
+ARM_QUERIES = 4
+CHANNEL_QUERIES = 3
+
+# Transfer formats by preference: resolution first
+FORMAT_PREFERENCE = [WaveformFormat.WORD, WaveformFormat.BYTE, WaveformFormat.ASCII]
+
+
+@dataclass
+class AcquisitionPlan:
+    """Estimated cost of a single capture, sizes in bytes and durations in seconds."""
+
+    points: int  # per channel and segment
+    sample_rate: float  # Sa/s
+    segments: int
+    channels: int
+    waveform_format: WaveformFormat
+    transfer_bytes: int
+    transfer_time: float
+    acquisition_time: float  # Acquisition windows and trigger waits, averaged ones included
+    memory_bytes: int  # Transferred and parsed data held on host
+    file_bytes: Dict[FileFormat, int]
+
+    @property
+    def capture_time(self) -> float:
+        """Duration of a whole capture cycle."""
+        return self.acquisition_time + self.transfer_time
+
+    @property
+    def shot_rate(self) -> float:
+        """Achievable captures per second (segments count as one capture)."""
+        return 1 / self.capture_time
+
+    def describe(self) -> str:
+        return (
+            f"{self.waveform_format.name:>5} {self.points:>8} pts "
+            f"{self.sample_rate / 1e6:>8.3f} MSa/s "
+            f"{self.transfer_bytes / 1e6:>9.3f} MB "
+            f"{self.transfer_time * 1e3:>9.1f} ms "
+            f"{self.memory_bytes / 1e6:>9.1f} MB RAM "
+            f"{self.shot_rate:>8.2f} shots/s"
+        )
+
+
+def plan(
+    config: KeysightConfig,
+    waveform_format: WaveformFormat = None,
+    link_rate: float = DEFAULT_LINK_RATE,
+    command_latency: float = DEFAULT_COMMAND_LATENCY,
+    trigger_period: float = 0.0,
+) -> AcquisitionPlan:
+    """
+    Estimate cost of a capture with a configuration (and its format, unless given).
+    `trigger_period` is the expected wait for a trigger, per segment.
+    """
+    waveform_format = waveform_format or config.waveform_format
+    points = config.waveform_points
+    segments = config.segment_count
+    channels = len(config.channels)
+    samples = points * segments * channels
+
+    transfer_bytes = samples * TRANSFER_BYTES[waveform_format]
+    queries = ARM_QUERIES + CHANNEL_QUERIES * channels + (segments > 1)
+    transfer_time = transfer_bytes / link_rate + queries * command_latency
+
+    rows = points * segments
+    return AcquisitionPlan(
+        points=points,
+        sample_rate=config.sample_rate,
+        segments=segments,
+        channels=channels,
+        waveform_format=waveform_format,
+        transfer_bytes=transfer_bytes,
+        transfer_time=transfer_time,
+        acquisition_time=segments
+        * config.average_count
+        * (config.time_range + trigger_period),
+        memory_bytes=transfer_bytes + samples * PARSED_BYTES,
+        file_bytes={
+            FileFormat.CSV: rows * (CSV_TIMESTAMP_BYTES + channels * CSV_VALUE_BYTES),
+            FileFormat.BINARY: BINARY_HEADER_BYTES
+            + samples * STORED_BYTES[waveform_format],
+        },
+    )
+
+
+def plan_formats(config: KeysightConfig, **kwargs) -> Dict[WaveformFormat, AcquisitionPlan]:
+    """Estimate cost of a configuration for every transfer format."""
+    return {fmt: plan(config, fmt, **kwargs) for fmt in WaveformFormat}
+
+
+def with_points(config: KeysightConfig, points: int) -> KeysightConfig:
+    """Return a copy of a configuration sampled to get exactly `points` points."""
+    frequency = points / (HORIZONTAL_DIVISIONS * config.time_range)
+    frequency /= config.frequency_unit.value
+    return dataclasses.replace(config, frequency=frequency)
+
+
+def fit_to_budget(
+    config: KeysightConfig,
+    min_shot_rate: float = None,
+    max_memory: int = None,
+    formats: List[WaveformFormat] = None,
+    **kwargs,
+) -> Optional[Tuple[KeysightConfig, AcquisitionPlan]]:
+    """
+    Return the configuration with the largest point count (then best format)
+    meeting a minimum shot rate and a maximum host memory, with its plan.
+    Return None if even the smallest point count does not fit.
+    """
+    formats = formats or FORMAT_PREFERENCE
+    for points in sorted(ALLOWED_WAVEFORM_POINTS, reverse=True):
+        candidate = with_points(config, points)
+        for fmt in formats:
+            estimate = plan(candidate, fmt, **kwargs)
+            if min_shot_rate is not None and estimate.shot_rate < min_shot_rate:
+                continue
+            if max_memory is not None and estimate.memory_bytes > max_memory:
+                continue
+            return dataclasses.replace(candidate, waveform_format=fmt), estimate
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Estimate capture costs.")
+    parser.add_argument("--points", type=int, default=None, help="Plan this size only")
+    parser.add_argument("--segments", type=int, default=1)
+    parser.add_argument("--range-ms", type=float, default=2, help="Acquisition window, ms")
+    parser.add_argument("--link-rate", type=float, default=DEFAULT_LINK_RATE / 1e6)
+    parser.add_argument("--latency-ms", type=float, default=DEFAULT_COMMAND_LATENCY * 1e3)
+    parser.add_argument("--shot-rate", type=float, help="Fit to this shots/s target")
+    parser.add_argument("--memory-mb", type=float, help="Fit to this host memory")
+    args = parser.parse_args()
+
+    base = dataclasses.replace(
+        make_config(ALLOWED_WAVEFORM_POINTS[0], range_ms=args.range_ms),
+        segment_count=args.segments,
+    )
+    kwargs = {
+        "link_rate": args.link_rate * 1e6,
+        "command_latency": args.latency_ms * 1e-3,
+    }
+
+    if args.shot_rate or args.memory_mb:
+        fit = fit_to_budget(
+            base,
+            args.shot_rate,
+            args.memory_mb * 1e6 if args.memory_mb else None,
+            **kwargs,
+        )
+        print(fit[1].describe() if fit else "No configuration fits this budget")
+        return
+
+    sizes = [args.points] if args.points else ALLOWED_WAVEFORM_POINTS
+    for points in sizes:
+        for estimate in plan_formats(with_points(base, points), **kwargs).values():
+            print(estimate.describe())
+
+
+if __name__ == "__main__":
+    main()
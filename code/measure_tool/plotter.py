@@ -1,16 +1,57 @@
 import os
 import sys
+import glob
+import time
 import random
+import hashlib
 import logging
-from typing import List
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Tuple, Union
 
+import numpy as np
 import pandas as pd
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 
+import capture_file
+from archive import CaptureArchive
+from dataclass import Capture, FileFormat
+from decimation import DecimationMethod, decimate
+from instrumentation import NULL_PROFILER, Profiler
+
+# Points per trace when decimating, about twice a full HD plot width
+DEFAULT_POINT_BUDGET = 4000
+DEFAULT_DASH_PORT = 8050
+
+# Files are loaded in parallel by this many threads (parsers release the GIL)
+LOAD_WORKERS = min(8, os.cpu_count() or 1)
+TIMESTAMP_DTYPE = np.float64  # Sub-ns resolution is needed on long captures
+VALUE_DTYPE = np.float32  # Beyond 16 bits ADC resolution
+
+try:
+    import pyarrow  # pylint: disable = unused-import
+
+    CSV_ENGINE = "pyarrow"
+except ImportError:
+    CSV_ENGINE = "c"
+
 # Set up logging
 logger = logging.getLogger(__name__)
 
+# Column name -> (timestamps, values) of a single file
+Traces = Dict[str, Tuple[np.ndarray, np.ndarray]]
+
+# Loaded data: CSV files are DataFrames, capture files and collected data are captures
+Data = Union[pd.DataFrame, Capture]
+
+# Decimated traces, keyed by file path, modification time, budget and method.
+# Least recently used entries are dropped past TRACES_CACHE_SIZE.
+TRACES_CACHE_SIZE = 32
+_traces_cache: "OrderedDict[tuple, Traces]" = OrderedDict()
+_traces_cache_lock = threading.Lock()
+
 
 def _get_random_color() -> tuple[str, str]:
     """Return a random color from a predefined palette."""
@@ -18,26 +59,144 @@ def _get_random_color() -> tuple[str, str]:
     return random.choice(colors)
 
 
-def _load_csv_file(filepath: str) -> pd.DataFrame:
+def _read_columns(filepath: str) -> List[str]:
+    """Return column names of a CSV or binary capture file, without loading data."""
+    if filepath.endswith(FileFormat.BINARY.value):
+        header, _ = capture_file.read_header(filepath)
+        return ["Timestamp"] + [ch["name"] for ch in header["channels"]]
+    with open(filepath, "r", encoding="utf-8") as f:
+        return f.readline().strip().split(",")
+
+
+def _load_csv_file(filepath: str, columns: List[str] = None) -> pd.DataFrame:
     """Load a CSV file into a DataFrame and ensure content validity."""
-    df = pd.read_csv(filepath)
+    columns = columns or _read_columns(filepath)
+    dtypes = {name: VALUE_DTYPE for name in columns}
+    dtypes["Timestamp"] = TIMESTAMP_DTYPE
+    df = pd.read_csv(filepath, dtype=dtypes, engine=CSV_ENGINE)
     if df.empty or len(df.columns) < 1:
         raise ValueError(f"CSV file '{filepath}' is empty or has no columns.")
     return df
 
 
-def check_df_consistency(dataframes: List[pd.DataFrame], filenames: List[str]) -> None:
-    """Ensure all DataFrames have the same structure."""
-    reference_columns = dataframes[0].columns
-    for i, df in enumerate(dataframes[1:], start=1):
-        if not reference_columns.equals(df.columns):
+def _cache_path(cache_dir: str, filepath: str) -> str:
+    """Return parsed frame cache file of a data file, keyed by its path and mtime."""
+    key = hashlib.sha1(os.path.abspath(filepath).encode()).hexdigest()
+    return os.path.join(cache_dir, f"{key}_{os.stat(filepath).st_mtime_ns}.pkl")
+
+
+def _load_file(filepath: str, cache_dir: str = None) -> Data:
+    """
+    Load a CSV file into a DataFrame, or a binary capture file into a `Capture`.
+    Parsed CSV files are cached in `cache_dir`, if set.
+    """
+    if filepath.endswith(FileFormat.BINARY.value):
+        capture = capture_file.load_capture(filepath)
+        if not capture or not capture.waveform(next(iter(capture))).points:
+            raise ValueError(f"Capture file '{filepath}' is empty.")
+        return capture
+
+    if cache_dir is None:
+        return _load_csv_file(filepath)
+
+    cache_path = _cache_path(cache_dir, filepath)
+    if os.path.exists(cache_path):
+        return pd.read_pickle(cache_path)
+
+    df = _load_csv_file(filepath)
+    os.makedirs(cache_dir, exist_ok=True)
+    for stale in glob.glob(cache_path.rsplit("_", 1)[0] + "_*.pkl"):
+        os.remove(stale)
+    df.to_pickle(cache_path)
+    return df
+
+
+def check_columns_consistency(columns: List[List[str]], filenames: List[str]) -> None:
+    """Ensure all files have the same columns, before loading them."""
+    for i, file_columns in enumerate(columns[1:], start=1):
+        if file_columns != columns[0]:
             logger.error("Inconsistent columns in file: %s", filenames[i])
             sys.exit(-1)
 
 
-def build_figure(dataframes, filenames, marker1_ns=None, marker2_ns=None) -> go.Figure:
-    """Create and return a plotly figure with subplots for each column of the dataframes."""
-    column_names = dataframes[0].columns.tolist()
+def _window_trace(
+    x: np.ndarray,
+    y: np.ndarray,
+    x_range: Tuple[float, float] = None,
+    max_points: int = None,
+    method: DecimationMethod = DecimationMethod.MINMAX,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Restrict a trace to `x_range` (if any), then decimate it to `max_points` (if any)."""
+    if x_range is not None:
+        start, stop = np.searchsorted(x, x_range)
+        window = slice(max(start - 1, 0), stop + 1)
+        x, y = x[window], y[window]
+    if max_points:
+        x, y = decimate(x, y, max_points, method)
+    return x, y
+
+
+def _columns(data: Data) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+    """Return timestamps and values of each channel, segments laid end to end."""
+    if isinstance(data, Capture):
+        return data.time.ravel(), {name: np.ravel(values) for name, values in data.items()}
+    x = data["Timestamp"].to_numpy()
+    return x, {col_name: data[col_name].to_numpy() for col_name in data.columns[1:]}
+
+
+def frame_traces(
+    data: Data,
+    max_points: int = None,
+    method: DecimationMethod = DecimationMethod.MINMAX,
+) -> Traces:
+    """Return (timestamps, values) of each column, decimated to `max_points` if set."""
+    x, columns = _columns(data)
+    return {
+        col_name: _window_trace(x, y, None, max_points, method)
+        for col_name, y in columns.items()
+    }
+
+
+def _file_traces(
+    path: str,
+    df: Data,
+    max_points: int,
+    method: DecimationMethod = DecimationMethod.MINMAX,
+) -> Traces:
+    """Return decimated traces of a loaded file, cached per file version."""
+    key = (path, os.path.getmtime(path), max_points, method)
+    with _traces_cache_lock:
+        traces = _traces_cache.get(key)
+        if traces is not None:
+            _traces_cache.move_to_end(key)
+            return traces
+
+    traces = frame_traces(df, max_points, method)
+    with _traces_cache_lock:
+        _traces_cache[key] = traces
+        while len(_traces_cache) > TRACES_CACHE_SIZE:
+            _traces_cache.popitem(last=False)
+    return traces
+
+
+def build_figure(
+    dataframes: List[Union[Data, Traces]],
+    filenames,
+    marker1_ns=None,
+    marker2_ns=None,
+    max_points: int = None,
+) -> go.Figure:
+    """
+    Create and return a plotly figure with subplots for each column of the dataframes.
+    Dataframes may be given as captures, or as already computed traces (see `frame_traces`).
+    When `max_points` is set, traces are decimated and rendered with WebGL.
+    """
+    traces_list = [
+        df if isinstance(df, dict) else frame_traces(df, max_points)
+        for df in dataframes
+    ]
+    column_names = ["Timestamp"] + list(traces_list[0])
+    scatter = go.Scattergl if max_points else go.Scatter
     fig = make_subplots(
         rows=len(column_names),
         cols=1,
@@ -46,15 +205,16 @@ def build_figure(dataframes, filenames, marker1_ns=None, marker2_ns=None) -> go.
         vertical_spacing=0.06,
     )
 
-    for index, df in enumerate(dataframes):
-        filename = filenames[index].removesuffix(".csv")
+    for index, traces in enumerate(traces_list):
+        filename = os.path.splitext(filenames[index])[0]
         color = _get_random_color()
 
         for row, col_name in enumerate(column_names[1:], start=1):  # Skip 'Timestamp'
+            x, y = traces[col_name]
             fig.add_trace(
-                go.Scatter(
-                    x=df["Timestamp"],
-                    y=df[col_name],
+                scatter(
+                    x=x,
+                    y=y,
                     name=f"{col_name} - {filename}, measure {index}",
                     line=dict(color=color),
                 ),
@@ -86,32 +246,62 @@ def build_figure(dataframes, filenames, marker1_ns=None, marker2_ns=None) -> go.
     return fig
 
 
+def _load_files(
+    folder: str, filenames: List[str], cache_dir: str = None
+) -> Tuple[List[str], List[Data]]:
+    """
+    Return paths and loaded data of CSV or binary capture files.
+    Headers are checked for consistency first, then files are loaded in parallel.
+    """
+    extensions = tuple(f.value for f in FileFormat)
+    paths = []
+    for file in filenames:
+        if not file.endswith(extensions):
+            logger.error(
+                f"File:{file} is not a CSV or capture file.",
+            )
+            sys.exit(-1)
+        paths.append(os.path.join(folder, file))
+
+    check_columns_consistency([_read_columns(path) for path in paths], filenames)
+
+    with ThreadPoolExecutor(max_workers=LOAD_WORKERS) as executor:
+        dataframes = list(executor.map(lambda p: _load_file(p, cache_dir), paths))
+    return paths, dataframes
+
+
 def plot_collected_data(
     folder: str,
     filenames: List[str],
     html_name: str = None,
     marker1_ns: float = None,
     marker2_ns: float = None,
+    max_points: int = DEFAULT_POINT_BUDGET,
+    method: DecimationMethod = DecimationMethod.MINMAX,
+    cache_dir: str = None,
+    profiler: Profiler = NULL_PROFILER,
 ) -> None:
     """
-    Plot measurements from CSV files in subplots.
+    Plot measurements from CSV or binary capture files in subplots.
     Each subplot corresponds to a column in the data (excluding 'Timestamp').
+    Traces longer than `max_points` are decimated (None plots every sample).
+    Parsed files are cached in `cache_dir` if set, making re-plots instant.
+    Loading, decimation, figure build and HTML export are timed by `profiler`.
     """
     logger.info("Plotting data from folder: %s", folder)
-    csv_paths = []
-    for file in filenames:
-        if not file.endswith(".csv"):
-            logger.error(
-                f"File:{file} is not a CSV file.",
-            )
-            sys.exit(-1)
-        csv_paths.append(os.path.join(folder, file))
-
-    dataframes = [_load_csv_file(path) for path in csv_paths]
-    check_df_consistency(dataframes, filenames)
+    start = time.perf_counter()
+    paths, dataframes = _load_files(folder, filenames, cache_dir)
+    profiler.stage("load", start, sum(os.path.getsize(path) for path in paths))
+    if max_points:
+        with profiler.span("decimate"):
+            dataframes = [
+                _file_traces(path, df, max_points, method)
+                for path, df in zip(paths, dataframes)
+            ]
 
     logger.info("Data loaded successfully. Building figure...")
-    fig = build_figure(dataframes, filenames, marker1_ns, marker2_ns)
+    with profiler.span("build_figure"):
+        fig = build_figure(dataframes, filenames, marker1_ns, marker2_ns, max_points)
     fig.show()
 
     logger.info("Figure built successfully. Saving to HTML...")
@@ -119,4 +309,131 @@ def plot_collected_data(
         if not html_name.endswith(".html"):
             logger.error("File:'%s' is not an html file.", html_name)
             sys.exit(-1)
-        fig.write_html(os.path.join(folder, html_name))
+        with profiler.span("write_html"):
+            fig.write_html(os.path.join(folder, html_name))
+
+
+def plot_capture(
+    capture: Capture,
+    name: str = "capture",
+    html_path: str = None,
+    max_points: int = DEFAULT_POINT_BUDGET,
+    method: DecimationMethod = DecimationMethod.MINMAX,
+) -> go.Figure:
+    """Plot a collected capture (see `KeysightDevice.collect`) without saving it first."""
+    traces = frame_traces(capture, max_points, method)
+    fig = build_figure([traces], [name], max_points=max_points)
+    if html_path is not None:
+        fig.write_html(html_path)
+    return fig
+
+
+def plot_archive(
+    archive_path: str,
+    html_name: str = None,
+    start=None,
+    stop=None,
+    tags: List[str] = (),
+    channels: List[str] = None,
+    max_points: int = DEFAULT_POINT_BUDGET,
+    method: DecimationMethod = DecimationMethod.MINMAX,
+) -> None:
+    """
+    Plot captures of an archive triggered in [start, stop) and holding `tags`
+    (see `CaptureArchive.select`), only reading selected captures and channels.
+    """
+    with CaptureArchive(archive_path, readonly=True) as archive:
+        entries = archive.select(start, stop, tags)
+        if not len(entries):
+            logger.error("No capture selected in: %s", archive_path)
+            return
+        logger.info("Plotting %d captures of: %s", len(entries), archive_path)
+        traces = [
+            frame_traces(archive.read(entry, channels), max_points, method)
+            for entry in entries
+        ]
+        names = [f"capture {entry['id']}" for entry in entries]
+
+    fig = build_figure(traces, names, max_points=max_points)
+    fig.show()
+    if html_name is not None:
+        fig.write_html(html_name)
+
+
+def _visible_ranges(relayout: Dict, ranges: Dict[int, Tuple[float, float]]) -> None:
+    """Update visible x range of each subplot row from a plotly relayout event."""
+    for key, value in relayout.items():
+        axis, _, prop = key.partition(".")
+        if not axis.startswith("xaxis"):
+            continue
+        row = int(axis[len("xaxis") :] or 1)
+        if prop == "autorange":
+            ranges.pop(row, None)
+        elif prop == "range":
+            ranges[row] = tuple(value)
+        elif prop == "range[0]":
+            ranges[row] = (value, ranges.get(row, (None, None))[1])
+        elif prop == "range[1]":
+            ranges[row] = (ranges.get(row, (None, None))[0], value)
+
+
+def serve_interactive(
+    folder: str,
+    filenames: List[str],
+    max_points: int = DEFAULT_POINT_BUDGET,
+    method: DecimationMethod = DecimationMethod.MINMAX,
+    port: int = DEFAULT_DASH_PORT,
+    cache_dir: str = None,
+) -> None:
+    """
+    Serve measurements on a local Dash page (requires the optional `dash` package).
+    Zooming on a subplot reloads full resolution data of the visible window only.
+    """
+    try:
+        # pylint: disable = import-outside-toplevel
+        from dash import Dash, Input, Output, dcc
+    except ImportError:
+        logger.error("Interactive mode requires dash: pip install dash")
+        sys.exit(-1)
+
+    paths, dataframes = _load_files(folder, filenames, cache_dir)
+    columns = [_columns(data) for data in dataframes]
+    column_names = list(columns[0][1])
+    overview = [
+        _file_traces(path, df, max_points, method) for path, df in zip(paths, dataframes)
+    ]
+    ranges = {}
+
+    def make_figure() -> go.Figure:
+        traces_list = []
+        for index, (x, values) in enumerate(columns):
+            traces = {}
+            for row, col_name in enumerate(column_names, start=1):
+                if row in ranges:
+                    traces[col_name] = _window_trace(
+                        x, values[col_name], ranges[row], max_points, method
+                    )
+                else:
+                    traces[col_name] = overview[index][col_name]
+            traces_list.append(traces)
+
+        fig = build_figure(traces_list, filenames, max_points=max_points)
+        for row, x_range in ranges.items():
+            fig.update_xaxes(range=list(x_range), row=row, col=1)
+        fig.update_layout(uirevision="zoom")  # Keep user zoom across updates
+        return fig
+
+    app = Dash(__name__)
+    app.layout = dcc.Graph(id="graph", figure=make_figure(), style={"height": "95vh"})
+
+    @app.callback(
+        Output("graph", "figure"),
+        Input("graph", "relayoutData"),
+        prevent_initial_call=True,
+    )
+    def _on_zoom(relayout):
+        _visible_ranges(relayout or {}, ranges)
+        return make_figure()
+
+    logger.info("Serving measurements on http://127.0.0.1:%d", port)
+    app.run(port=port, debug=False)
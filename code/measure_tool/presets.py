@@ -0,0 +1,50 @@
+"""
+Reference configurations shared by tools (benchmark, planner).
+
+Channels and trigger follow the `main.py` wiring: emitter on channel 1,
+left and right receivers on channels 2 and 3.
+"""
+
+from dataclass import (
+    HORIZONTAL_DIVISIONS,
+    Channel,
+    FrequencyUnit,
+    KeysightConfig,
+    SlopeType,
+    TimeUnit,
+    Trigger,
+    TriggerSource,
+    VoltageUnit,
+    WaveformFormat,
+)
+
+DEFAULT_RANGE_MS = 1  # Acquisition window
+
+
+def make_config(
+    points: int,
+    waveform_format: WaveformFormat = WaveformFormat.WORD,
+    range_ms: float = DEFAULT_RANGE_MS,
+) -> KeysightConfig:
+    """Return the main.py channel layout over `range_ms`, sampled to get exactly `points` points."""
+    channels = [
+        Channel(number=1, name="EMITTER", vertical_scale=2),
+        Channel(
+            number=2, name="RCVR_L", vertical_scale=12.5, vertical_unit=VoltageUnit.mV
+        ),
+        Channel(
+            number=3, name="RCVR_R", vertical_scale=50, vertical_unit=VoltageUnit.mV
+        ),
+    ]
+    trigger = Trigger(
+        source=TriggerSource.CHANNEL_1, slope=SlopeType.POSITIVE, threshold=2
+    )
+    return KeysightConfig(
+        channels=channels,
+        trigger=trigger,
+        horizontal_range=range_ms,
+        horizontal_unit=TimeUnit.MS,
+        frequency=points / (HORIZONTAL_DIVISIONS * range_ms * TimeUnit.MS.value),
+        frequency_unit=FrequencyUnit.HZ,
+        waveform_format=waveform_format,
+    )
@@ -0,0 +1,440 @@
+# pylint: disable = missing-function-docstring, missing-class-docstring
+# pylint: disable = unused-argument
+
+"""
+In-process simulated Keysight oscilloscope.
+
+Drop-in replacement for `pyvisa.ResourceManager` answering the SCPI subset used
+by `KeysightDevice`. Waveforms mimic the test board: an 8 cycles burst at 41.7 kHz
+on the emitter channel (channel 1) and noisy, delayed echoes on receiver channels.
+
+Usage:
+    device = KeysightDevice(config, state_file=None)
+    device.connect(resource_manager=SimulatedResourceManager())
+"""
+
+import logging
+import time
+from typing import Dict, List
+
+import numpy as np
+from pyvisa import constants
+from pyvisa.errors import VisaIOError
+
+from keysight import ESR_OPC, OPER_RUN, SRE_ESB
+
+# Test board burst, see `code_test.c`
+BURST_FREQUENCY = 41700  # Hz
+BURST_CYCLES = 8
+EMITTER_VOLTAGE = 3.3  # V
+EMITTER_CHANNEL = 1
+
+DEFAULT_TRIGGER_DELAY = 0.005  # s, time between arm and trigger
+DEFAULT_NOISE = 0.002  # V rms on receivers
+DEFAULT_ECHO_AMPLITUDE = 0.04  # V
+DEFAULT_DELAYS = {2: 124e-6, 3: 126e-6, 4: 130e-6}  # s, emitter to receiver
+SEGMENT_PERIOD = 0.01  # s, time between two bursts
+
+SIM_ADDRESS_FORMAT = "USB0::0x2A8D::0x1770::SIM{:05d}::0::INSTR"
+SIM_IDN_FORMAT = "KEYSIGHT TECHNOLOGIES,SIM-X3034T,SIM{:05d},1.0"
+SIM_ADDRESS = SIM_ADDRESS_FORMAT.format(0)
+
+NO_ERROR = '+0,"No error"'
+MEASUREMENT_INVALID = "9.9E+37"
+UNDEFINED_HEADER = '-113,"Undefined header"'
+
+# Number of vertical divisions and binary code layout per format
+VERTICAL_DIVISIONS = 8
+CODES = {
+    "BYTE": (np.uint8, 256),
+    "WORD": (np.uint16, 65536),
+}
+
+logger = logging.getLogger(__name__)
+
+
+class _WaitResponse:
+    def __init__(self, timed_out: bool):
+        self.timed_out = timed_out
+
+
+class SimulatedOscilloscope:
+    """Simulated instrument, exposes the pyvisa resource methods used by the driver."""
+
+    def __init__(
+        self,
+        trigger_delay: float = DEFAULT_TRIGGER_DELAY,
+        noise: float = DEFAULT_NOISE,
+        delays: Dict[int, float] = None,
+        link_rate: float = None,
+        seed: int = None,
+        serial: int = 0,
+    ):
+        self.serial = serial
+        self.trigger_delay = trigger_delay
+        self.noise = noise
+        self.delays = delays or DEFAULT_DELAYS
+        self.link_rate = link_rate  # bytes/s, None for an unlimited link
+        self.timeout = 2000  # ms
+        self._rng = np.random.default_rng(None if seed is None else seed + serial)
+
+        self.settings = {}
+        self.errors = []
+        self._esr = 0
+        self._ese = 0
+        self._sre = 0
+        self._opc_armed = False
+        self._blocking_until = 0.0
+        self._ready_at = 0.0
+        self._waveforms = {}
+        self._srq_enabled = False
+        self._reset()
+
+    # Device state
+
+    def _reset(self):
+        self.settings = {
+            ":TIMebase:SCALe": "1.0E-4",
+            ":WAVeform:FORMat": "ASCii",
+            ":WAVeform:POINts": "1000",
+            ":WAVeform:SOURce": "CHANnel1",
+            ":ACQuire:MODE": "RTIMe",
+            ":ACQuire:TYPE": "NORMal",
+            ":ACQuire:SEGMented:COUNt": "2",
+        }
+        for ch in range(1, 5):
+            self.settings[f":CHANnel{ch}:SCALe"] = "1.0E+0V"
+            self.settings[f":CHANnel{ch}:OFFSet"] = "0.0E+0V"
+
+    def _running(self) -> bool:
+        return time.monotonic() < self._ready_at
+
+    def _update_esr(self):
+        if self._opc_armed and not self._running():
+            self._esr |= ESR_OPC
+            self._opc_armed = False
+
+    @property
+    def _segment_count(self) -> int:
+        if self.settings.get(":ACQuire:MODE", "").upper().startswith("SEGM"):
+            return int(self.settings[":ACQuire:SEGMented:COUNt"])
+        return 1
+
+    @property
+    def _average_count(self) -> int:
+        if self.settings.get(":ACQuire:TYPE", "").upper().startswith("AVER"):
+            return int(self.settings.get(":ACQuire:COUNt", "8"))
+        return 1
+
+    @property
+    def _points(self) -> int:
+        return int(float(self.settings[":WAVeform:POINts"]))
+
+    @property
+    def _time_range(self) -> float:
+        return 10 * float(self.settings[":TIMebase:SCALe"])
+
+    @staticmethod
+    def _volts(value: str) -> float:
+        value = value.strip()
+        if value.endswith("mV"):
+            return float(value[:-2]) * 1e-3
+        return float(value.rstrip("V"))
+
+    def _source(self) -> int:
+        return int(self.settings[":WAVeform:SOURce"][-1])
+
+    # Waveforms synthesis
+
+    def _synthesize(self, channel: int, t: np.ndarray) -> np.ndarray:
+        """Return channel voltage at times `t` (s, trigger at 0)."""
+        burst_duration = BURST_CYCLES / BURST_FREQUENCY
+        if channel == EMITTER_CHANNEL:
+            in_burst = (t >= 0) & (t < burst_duration)
+            high = np.sin(2 * np.pi * BURST_FREQUENCY * t) >= 0
+            return np.where(in_burst & high, EMITTER_VOLTAGE, 0.0)
+
+        delay = self.delays.get(channel, DEFAULT_DELAYS[2])
+        local_t = t - delay
+        # Transducer ring-up/ring-down: raised envelope over twice the burst length
+        envelope = np.where(
+            (local_t >= 0) & (local_t < 2 * burst_duration),
+            np.sin(np.pi * local_t / (2 * burst_duration)) ** 2,
+            0.0,
+        )
+        echo = DEFAULT_ECHO_AMPLITUDE * envelope * np.sin(
+            2 * np.pi * BURST_FREQUENCY * local_t
+        )
+        # Averaged acquisitions: uncorrelated noise falls as 1 / sqrt(count)
+        noise = self.noise / np.sqrt(self._average_count)
+        return echo + self._rng.normal(0.0, noise, t.shape)
+
+    def _acquire(self):
+        """Generate waveforms of every channel for a new acquisition."""
+        points = self._points
+        t = np.arange(points) * (self._time_range / points)
+        self._waveforms = {
+            ch: np.concatenate(
+                [self._synthesize(ch, t) for _ in range(self._segment_count)]
+            )
+            for ch in range(1, 5)
+        }
+        shots = self._segment_count * self._average_count
+        self._ready_at = time.monotonic() + self.trigger_delay * shots
+
+    def _preamble_values(self) -> List[float]:
+        fmt = self.settings[":WAVeform:FORMat"].upper()
+        ch = self._source()
+        scale = self._volts(self.settings[f":CHANnel{ch}:SCALe"])
+        offset = self._volts(self.settings[f":CHANnel{ch}:OFFSet"])
+        full_scale = VERTICAL_DIVISIONS * scale
+
+        if fmt in CODES:
+            _, levels = CODES[fmt]
+            y_increment, y_reference = full_scale / levels, levels // 2
+        else:
+            y_increment, y_reference = full_scale / 65536, 0
+        format_id = {"BYTE": 0, "WORD": 1}.get(fmt, 4)
+        x_increment = self._time_range / self._points
+        return [
+            format_id,
+            0,
+            self._points,
+            1,
+            x_increment,
+            0.0,
+            0,
+            y_increment,
+            offset,
+            y_reference,
+        ]
+
+    def _codes(self, values: np.ndarray) -> np.ndarray:
+        fmt = self.settings[":WAVeform:FORMat"].upper()
+        dtype, levels = CODES[fmt]
+        _, _, _, _, _, _, _, y_increment, y_origin, y_reference = self._preamble_values()
+        codes = np.round((values - y_origin) / y_increment + y_reference)
+        return np.clip(codes, 0, levels - 1).astype(dtype)
+
+    def _data(self) -> np.ndarray:
+        data = self._waveforms.get(self._source(), np.zeros(self._points))
+        if self._segment_count > 1 and self.settings.get(
+            ":WAVeform:SEGMented:ALL", "OFF"
+        ) not in ("ON", "1"):
+            data = data[-self._points :]  # Only the current (last) segment
+        return data
+
+    def _last_segment(self, channel: int) -> np.ndarray:
+        data = self._waveforms.get(channel, np.empty(0))
+        return data[-self._points :]
+
+    def _first_rising(self, values: np.ndarray, fraction: float) -> float:
+        """Return time (s) of first crossing of a level between min and max, or NaN."""
+        low, high = values.min(), values.max()
+        level = low + fraction * (high - low)
+        above = np.flatnonzero(values >= level)
+        if high <= low or not len(above):
+            return np.nan
+        i = above[0]
+        if i == 0:
+            return 0.0
+        # Linear interpolation between samples around the crossing
+        step = (level - values[i - 1]) / (values[i] - values[i - 1])
+        return (i - 1 + step) * self._time_range / self._points
+
+    def _measure(self, function: str, argument: str) -> str:
+        """
+        Evaluate a measurement on the last acquired segment.
+        Edges are taken at the 90 % level, keeping receiver noise out.
+        """
+        try:
+            channels = [int(source.strip()[-1]) for source in argument.split(",")]
+            values = [self._last_segment(ch) for ch in channels]
+        except (ValueError, IndexError):
+            self.errors.append(UNDEFINED_HEADER)
+            return MEASUREMENT_INVALID
+        if not all(len(v) for v in values):
+            return MEASUREMENT_INVALID
+
+        x = values[0]
+        if function == "DELAY" and len(values) == 2:
+            result = self._first_rising(values[1], 0.9) - self._first_rising(x, 0.9)
+        elif function == "VPP":
+            result = x.max() - x.min()
+        elif function == "VMAX":
+            result = x.max()
+        elif function == "VMIN":
+            result = x.min()
+        elif function == "VRMS":
+            result = np.sqrt(np.mean(x**2))
+        elif function == "RISETIME":
+            result = self._first_rising(x, 0.9) - self._first_rising(x, 0.1)
+        elif function == "FALLTIME":
+            result = self._first_rising(-x, 0.9) - self._first_rising(-x, 0.1)
+        elif function == "FREQUENCY":
+            middle = (x.max() + x.min()) / 2
+            rising = np.flatnonzero((x[:-1] < middle) & (x[1:] >= middle))
+            span = (rising[-1] - rising[0]) if len(rising) > 1 else 0
+            result = (
+                (len(rising) - 1) * self._points / (span * self._time_range)
+                if span
+                else np.nan
+            )
+        else:
+            self.errors.append(UNDEFINED_HEADER)
+            return MEASUREMENT_INVALID
+        return MEASUREMENT_INVALID if np.isnan(result) else f"{result:.6E}"
+
+    def _throttle(self, size: int):
+        if self.link_rate:
+            time.sleep(size / self.link_rate)
+
+    # SCPI handling
+
+    def _command(self, command: str):
+        header, _, value = command.strip().partition(" ")
+        upper = header.upper()
+        if upper == "*RST":
+            self._reset()
+        elif upper == "*CLS":
+            self._esr = 0
+            self.errors.clear()
+        elif upper == "*ESE":
+            self._ese = int(value)
+        elif upper == "*SRE":
+            self._sre = int(value)
+        elif upper == "*OPC":
+            self._opc_armed = True
+        elif upper == ":SINGLE":
+            self._acquire()
+        elif upper == ":DIGITIZE":
+            self._acquire()
+            self._blocking_until = self._ready_at
+        elif upper in (":STOP", ":RUN"):
+            self._ready_at = 0.0
+        elif upper == ":MEASURE:CLEAR":
+            pass
+        elif value:
+            self.settings[header] = value
+        else:
+            self.errors.append(UNDEFINED_HEADER)
+
+    def _answer(self, query: str) -> str:
+        header, _, argument = query.strip().partition(" ")
+        upper = header.upper()
+        if upper == "*IDN?":
+            return SIM_IDN_FORMAT.format(self.serial)
+        if upper == "*OPC?":
+            time.sleep(max(0.0, self._blocking_until - time.monotonic()))
+            return "1"
+        if upper == "*ESR?":
+            self._update_esr()
+            esr, self._esr = self._esr, 0
+            return str(esr)
+        if upper == ":SYSTEM:ERROR?":
+            return self.errors.pop(0) if self.errors else NO_ERROR
+        if upper == ":OPEREGISTER:CONDITION?":
+            return str(OPER_RUN if self._running() else 0)
+        if upper == ":WAVEFORM:PREAMBLE?":
+            return ",".join(str(v) for v in self._preamble_values())
+        if upper == ":WAVEFORM:SEGMENTED:XLIST?" and argument.upper().startswith("TTAG"):
+            count = self._segment_count
+            return ",".join(f"{i * SEGMENT_PERIOD:.9E}" for i in range(count))
+        if upper.startswith(":MEASURE:"):
+            return self._measure(upper[len(":MEASURE:") : -1], argument)
+        if upper == ":WAVEFORM:DATA?":
+            body = ",".join(map("{:.6E}".format, self._data()))
+            return f"#8{len(body):08d}{body}"
+        if header in self.settings or header[:-1] in self.settings:
+            return self.settings.get(header[:-1], self.settings.get(header))
+
+        self.errors.append(UNDEFINED_HEADER)
+        return ""
+
+    # pyvisa resource interface
+
+    def write(self, message: str):
+        for command in message.split(";"):
+            if command.strip():
+                self._command(command)
+        self._throttle(len(message))
+        return len(message)
+
+    def query(self, message: str) -> str:
+        answers = []
+        for command in message.split(";"):
+            if command.strip().endswith("?") or "? " in command:
+                answers.append(self._answer(command))
+            elif command.strip():
+                self._command(command)
+        answer = ";".join(answers) + "\n"
+        self._throttle(len(answer))
+        return answer
+
+    def query_binary_values(
+        self,
+        message: str,
+        datatype: str = "f",
+        is_big_endian: bool = False,
+        container=list,
+        **kwargs,
+    ):
+        if message.strip().upper() != ":WAVEFORM:DATA?":
+            raise VisaIOError(constants.StatusCode.error_timeout)
+        fmt = self.settings[":WAVeform:FORMat"].upper()
+        if fmt not in CODES:
+            raise VisaIOError(constants.StatusCode.error_timeout)
+
+        codes = self._codes(self._data())
+        self._throttle(codes.nbytes)
+        return container(codes)
+
+    def read_stb(self) -> int:
+        self._update_esr()
+        stb = SRE_ESB if self._esr & self._ese else 0
+        return stb | (0b1000000 if stb & self._sre else 0)
+
+    def enable_event(self, event_type, mechanism, context=None):
+        self._srq_enabled = True
+
+    def disable_event(self, event_type, mechanism):
+        self._srq_enabled = False
+
+    def wait_on_event(self, in_event_type, timeout: int, capture_timeout: bool = False):
+        remaining = self._ready_at - time.monotonic()
+        srq_pending = self._opc_armed or self._esr & ESR_OPC
+        if self._srq_enabled and srq_pending and remaining * 1000 <= timeout:
+            time.sleep(max(0.0, remaining))
+            self._update_esr()
+            if self._esr & self._ese and self._sre & SRE_ESB:
+                return _WaitResponse(timed_out=False)
+
+        time.sleep(timeout / 1000)
+        if not capture_timeout:
+            raise VisaIOError(constants.StatusCode.error_timeout)
+        return _WaitResponse(timed_out=True)
+
+    def close(self):
+        self._waveforms = {}
+
+
+class SimulatedResourceManager:
+    """Stand-in for `pyvisa.ResourceManager`, exposing `count` simulated scopes."""
+
+    def __init__(self, count: int = 1, **kwargs):
+        self._addresses = [SIM_ADDRESS_FORMAT.format(i) for i in range(count)]
+        self._kwargs = kwargs
+
+    def list_resources(self):
+        return tuple(self._addresses)
+
+    def open_resource(self, address: str) -> SimulatedOscilloscope:
+        if address not in self._addresses:
+            raise VisaIOError(constants.StatusCode.error_resource_not_found)
+        serial = self._addresses.index(address)
+        scope = SimulatedOscilloscope(serial=serial, **self._kwargs)
+        logger.debug("Opened simulated device %s", address)
+        return scope
+
+    def close(self):
+        pass
@@ -8,4 +8,14 @@ d = math.hypot(DX, DY)  # path length in m
 t_sec = d / C  # time in seconds
 t_ns = t_sec * 1e9  # time in nanoseconds
 
-print(f"Distance = {d:.4f} m,  Time-of-flight = {t_ns:.0f} ns")
+C0 = 331.3  # speed of sound in dry air at 0 °C, in m/s
+T0 = 273.15  # 0 °C in kelvins
+
+
+def speed_of_sound(temperature: float) -> float:
+    """Speed of sound in dry air (m/s) at a temperature in °C."""
+    return C0 * math.sqrt(1 + temperature / T0)
+
+
+if __name__ == "__main__":
+    print(f"Distance = {d:.4f} m,  Time-of-flight = {t_ns:.0f} ns")
@@ -0,0 +1,241 @@
+"""
+Streaming wind speed and direction estimation.
+
+The emitter sits at the origin and the receivers at (-DX, DY) for RCVR_L and
+(+DX, DY) for RCVR_R (see `utils.py`), both at a distance d = hypot(DX, DY).
+Sound reaches a receiver at c + v, v being the wind projected on its path, so
+v = d / t - c for a time of flight t. From both projections:
+    wx = (vR - vL) * d / (2 * DX)
+    wy = (vR + vL) * d / (2 * DY)
+Direction is the angle the wind blows toward, in degrees clockwise from the Y axis.
+
+Each capture row (a segment, or the whole capture) gives one `WindSample`,
+timestamped by the capture trigger time plus the segment time tag.
+Only running statistics and a bounded history are kept, never waveforms.
+
+Measured delays include the transducers group delay and wiring: receiver offsets
+must be measured on captures without wind (`calibrate`) or given, before any update.
+"""
+
+import csv
+import math
+import threading
+import time
+from collections import deque
+from typing import Deque, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+import analysis
+from dataclass import Capture
+from utils import DX, DY, d, speed_of_sound
+
+DEFAULT_TEMPERATURE = 20.0  # °C
+DEFAULT_SMOOTHING = 0.1  # Exponential smoothing factor of each new sample
+DEFAULT_HISTORY = 10000  # Samples kept in memory
+DEFAULT_MIN_SCORE = 0.3  # Rows correlating less with the emitter are dropped
+
+
+class WindSample(NamedTuple):
+    """Wind estimate of a single capture row."""
+
+    timestamp: float
+    wx: float  # m/s
+    wy: float  # m/s
+    speed: float  # m/s
+    direction: float  # degrees
+    temperature: float  # °C
+
+
+class RunningStats:
+    """Mean and variance of a stream of values (Welford algorithm)."""
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+
+    def add(self, value: float) -> None:
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+
+    @property
+    def variance(self) -> float:
+        return self._m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    @property
+    def std(self) -> float:
+        return math.sqrt(self.variance)
+
+
+class ExponentialSmoothing:
+    """Exponential moving average, `alpha` being the weight of each new value."""
+
+    def __init__(self, alpha: float = DEFAULT_SMOOTHING):
+        if not 0 < alpha <= 1:
+            raise ValueError("Smoothing factor must be in ]0, 1].")
+        self.alpha = alpha
+        self.value: Optional[float] = None
+
+    def add(self, value: float) -> float:
+        if self.value is None:
+            self.value = value
+        else:
+            self.value += self.alpha * (value - self.value)
+        return self.value
+
+
+def wind_components(
+    tof_left: np.ndarray, tof_right: np.ndarray, temperature: float
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Return (wx, wy) in m/s from times of flight (s) to the left and right receivers."""
+    c = speed_of_sound(temperature)
+    v_left = d / np.asarray(tof_left) - c
+    v_right = d / np.asarray(tof_right) - c
+    return (v_right - v_left) * d / (2 * DX), (v_right + v_left) * d / (2 * DY)
+
+
+class WindEstimator:
+    """
+    Turn captures into wind samples, as they arrive (possibly out of order, from
+    several campaign writers). `offsets` are the fixed delays (s) added by
+    transducers and wiring on each receiver, measured without wind by `calibrate`.
+    """
+
+    def __init__(
+        self,
+        temperature: float = DEFAULT_TEMPERATURE,
+        smoothing: float = DEFAULT_SMOOTHING,
+        history: int = DEFAULT_HISTORY,
+        min_score: float = DEFAULT_MIN_SCORE,
+        offsets: Optional[Tuple[float, float]] = None,
+        left: str = "RCVR_L",
+        right: str = "RCVR_R",
+        reference: str = analysis.DEFAULT_REFERENCE,
+    ):
+        self.temperature = temperature
+        self.min_score = min_score
+        self.offsets = offsets
+        self.left = left
+        self.right = right
+        self.reference = reference
+
+        self.speed = RunningStats()
+        self.wx = RunningStats()
+        self.wy = RunningStats()
+        self._smooth_wx = ExponentialSmoothing(smoothing)
+        self._smooth_wy = ExponentialSmoothing(smoothing)
+        self.samples: Deque[WindSample] = deque(maxlen=history)
+        self.dropped = 0
+        self._lock = threading.Lock()
+
+    @property
+    def calibrated(self) -> bool:
+        """True once receiver offsets are known."""
+        return self.offsets is not None
+
+    def _delays(self, capture: Capture) -> Tuple[np.ndarray, np.ndarray]:
+        """Return delays to both receivers, rows under `min_score` being NaN."""
+        x_increment = capture.waveform(self.reference).x_increment
+        if x_increment is None:
+            raise ValueError("Sample interval unknown, captures need a preamble.")
+        channels = {
+            name: capture[name] for name in (self.reference, self.left, self.right)
+        }
+        estimates = analysis.channel_delays(channels, x_increment, self.reference)
+        left, right = estimates[self.left], estimates[self.right]
+        valid = (left.score >= self.min_score) & (right.score >= self.min_score)
+        return (
+            np.where(valid, left.delay, np.nan),
+            np.where(valid, right.delay, np.nan),
+        )
+
+    def calibrate(self, capture: Capture) -> Tuple[float, float]:
+        """Measure receiver offsets from a capture taken without wind."""
+        left, right = self._delays(capture)
+        valid = ~(np.isnan(left) | np.isnan(right))
+        if not valid.any():
+            raise ValueError("No capture row correlates enough to calibrate.")
+        tof = d / speed_of_sound(self.temperature)
+        self.offsets = (
+            float(left[valid].mean()) - tof,
+            float(right[valid].mean()) - tof,
+        )
+        return self.offsets
+
+    def update(
+        self,
+        capture: Capture,
+        timestamp: float = None,
+        row_times: np.ndarray = None,
+        temperature: float = None,
+    ) -> List[WindSample]:
+        """
+        Estimate wind of every capture row, update statistics and return new samples.
+        Rows are timestamped `timestamp` (now by default) plus `row_times`, if given.
+        """
+        if not self.calibrated:
+            raise ValueError("Receiver offsets unknown, calibrate first.")
+        if temperature is not None:
+            self.temperature = temperature
+        timestamp = time.time() if timestamp is None else timestamp
+
+        left, right = self._delays(capture)
+        wx, wy = wind_components(
+            left - self.offsets[0], right - self.offsets[1], self.temperature
+        )
+        times = np.full(len(wx), timestamp, dtype=np.float64)
+        if row_times is not None and len(row_times) == len(wx):
+            times += row_times
+
+        new_samples = []
+        with self._lock:
+            for t, x, y in zip(times.tolist(), wx.tolist(), wy.tolist()):
+                if math.isnan(x) or math.isnan(y):
+                    self.dropped += 1
+                    continue
+                speed = math.hypot(x, y)
+                self.speed.add(speed)
+                self.wx.add(x)
+                self.wy.add(y)
+                self._smooth_wx.add(x)
+                self._smooth_wy.add(y)
+                sample = WindSample(
+                    t, x, y, speed, math.degrees(math.atan2(x, y)) % 360, self.temperature
+                )
+                self.samples.append(sample)
+                new_samples.append(sample)
+        return new_samples
+
+    def handler(self, _name: str, capture: Capture) -> None:
+        """Campaign capture handler (see `campaign.CaptureHandler`)."""
+        self.update(
+            capture, timestamp=capture.timestamp, row_times=capture.segment_times
+        )
+
+    def calibration_handler(self, _name: str, capture: Capture) -> None:
+        """Campaign capture handler calibrating on captures taken without wind."""
+        self.calibrate(capture)
+
+    @property
+    def smoothed(self) -> Optional[Tuple[float, float]]:
+        """Smoothed (speed, direction), averaging wind vectors rather than angles."""
+        if self._smooth_wx.value is None:
+            return None
+        x, y = self._smooth_wx.value, self._smooth_wy.value
+        return math.hypot(x, y), math.degrees(math.atan2(x, y)) % 360
+
+    def series(self) -> List[WindSample]:
+        """Return samples kept in history, in time order."""
+        with self._lock:
+            return sorted(self.samples, key=lambda sample: sample.timestamp)
+
+    def save_series(self, file_path: str) -> None:
+        """Write samples kept in history to a CSV file, in time order."""
+        samples = self.series()
+        with open(file_path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(WindSample._fields)
+            writer.writerows(samples)